@@ -1,10 +1,21 @@
 import network
-import espnow
-import socket
+import aioespnow
 import machine
 from pins import D4, D5, D6, D10, GPKEY
 import time
-import _thread
+import asyncio
+import binascii
+import gc
+import json
+import struct
+import heap
+import journal
+import metrics
+import lcd_proto
+from pattern import PatternPlayer, pattern_ms
+from debounce import DebouncedPin
+from response import Request, Response
+from bomb_state import BombState, ARMING, DISARMING, PHASE_NAMES, DISARM_HOLD_MS, DISARM_CHECKPOINT_MS
 
 # Wi-Fi Access Point (AP Mode)
 ap = network.WLAN(network.AP_IF)
@@ -23,7 +34,7 @@ print("Server running at http://192.168.4.1/")
 # ESP-Now Setup
 sta = network.WLAN(network.STA_IF)
 sta.active(True)
-e = espnow.ESPNow()
+e = aioespnow.AIOESPNow()
 e.active(1)
 peer = b'\x7c\xdf\xa1\x94\x11\x40'
 e.add_peer(peer)
@@ -37,511 +48,854 @@ buzzer.duty_u16(0)
 armed_led = machine.Pin(D5, machine.Pin.OUT)
 buzzer_led = machine.Pin(D6, machine.Pin.OUT)
 
+# Sound effects, as (freq, duty, duration_ms, led) steps
+ON = 2700
+BEEP = ((1000, ON, 50, 1),)
+START_BEEP = ((1000, ON, 300, 1), (0, 0, 100, 0)) * 3
+ARMED_BEEP = ((1000, ON, 50, 1), (0, 0, 100, 0)) * 2 + BEEP
+CANCEL_BEEP = ((1000, ON, 50, 1), (0, 0, 100, 0)) + BEEP
+DISARMED_BEEP = ((1000, ON, 50, 1), (0, 0, 100, 0)) * 3 + BEEP
+DISARM_TICK = ((1000, 2500, 30, 1),)
+DISARM_TICK_HIGH = ((1500, 2500, 30, 1),)  # a little bit higher pitch past halfway
+DEFUSED = ((1000, ON, 50, 1), (0, 0, 50, 0), (1000, ON, 50, 1), (1000, ON, 500, 1))
+FLATLINE = ((500, ON, None, 1),)
+
+# Higher priorities preempt lower ones
+PRIO_BEEP = 0
+PRIO_SIGNAL = 1
+PRIO_DISARM = 2
+PRIO_ALARM = 3
+
+player = PatternPlayer(buzzer, buzzer_led)
+
 # Physical buttons
 SWITCH = machine.Pin(GPKEY, machine.Pin.IN, machine.Pin.PULL_UP)
 BTN = machine.Pin(D4, machine.Pin.IN, machine.Pin.PULL_UP)
+DEBOUNCE_MS = 20
+ARM_HOLD_MS = 4000
+
+# Set from the pin IRQs whenever an input changes
+input_flag = asyncio.ThreadSafeFlag()
+switch = DebouncedPin(SWITCH, input_flag)
+btn = DebouncedPin(BTN, input_flag)
+
+# Event journal (see journal.py); it is written to flash between rounds
+JOURNAL_FILE = "journal.bin"
+JOURNAL_RECORDS = 256  # a whole round, countdown ticks included
+JOURNAL_FLUSH_MS = 5000
+
+history = journal.Journal(JOURNAL_RECORDS, JOURNAL_FILE)
+logged_phase = -1
+
+# Game state, see bomb_state.py; state_changed is set on every change
+state_changed = asyncio.Event()
 
-# Global State
-armed = False
-flat_tone = False
-cnt = False
-do_beep = True
-current_delay = "Disarmed"
-send_time = True
-
-# Physical button state tracking
-arm_progress = 0.0
-arm_holding = False
-last_switch_state = SWITCH.value()
-last_btn_state = BTN.value()
-arming_started = False
-
-# Disarm State
-disarm_enabled = False
-disarm_progress = 0.0
-disarm_active = False
+def on_state_change():
+    global logged_phase
+    state_changed.set()
+    if state.phase != logged_phase:
+        logged_phase = state.phase
+        history.log(journal.EV_PHASE, state.phase, disarm_left())
+
+state = BombState(on_state_change)
+countdown = None
 
 # --- Utility Functions ---
-def beep():
-    if do_beep:
-        buzzer.duty_u16(2700)
-        buzzer_led.on()
-        time.sleep(0.05)
-        buzzer.duty_u16(0)
-        buzzer_led.off()
-
-def start_beep():
-    for _ in range(3):
-        buzzer.duty_u16(2700)
-        buzzer_led.on()
-        time.sleep(0.3)
-        buzzer.duty_u16(0)
-        buzzer_led.off()
-        time.sleep(0.1)
-
-def flat_line(set_frq=False):
-    global flat_tone
-    buzzer.freq(500 if set_frq else 1000)
-    buzzer.duty_u16(2700)
-    buzzer_led.on()
-    flat_tone = True
+def beep(pattern=BEEP, priority=PRIO_BEEP):
+    # Quiet while the disarm is held, so its ticks can be heard
+    if state.phase != DISARMING:
+        player.play(pattern, priority)
+
+def flat_line(pattern=FLATLINE):
+    player.play(pattern, PRIO_ALARM)
+
+# --- LCD Link ---
+# The LCD board needs about this long to draw a frame; sending faster only
+# queues frames up on its side.
+LCD_MIN_INTERVAL_MS = 50
+# While frames go unanswered (the LCD board is off, say), the gap before the
+# next try doubles up to this
+LCD_MAX_BACKOFF_MS = 4000
+
+lcd_buf = bytearray(lcd_proto.FRAME_SIZE)
+lcd_view = memoryview(lcd_buf)
+# The latest text asked for on each line, and what the LCD is known to
+# show; lcd_sender sends whatever differs
+lcd_wanted = [None, None]
+lcd_sent = [None, None]
+lcd_wake = asyncio.Event()
 
 def update_lcd(line1="", line2=""):
-    msg = f"{line1}|{line2}".encode()
-    e.send(peer, msg)
+    """Queues two lines for the LCD board without waiting for the radio.
+
+    Pass None to leave a line as is. Text that has not been sent yet is
+    replaced, so bursts of updates collapse into the latest one.
+    """
+    if line1 is not None:
+        lcd_wanted[0] = line1
+    if line2 is not None:
+        lcd_wanted[1] = line2
+    lcd_wake.set()
+
+async def lcd_sender():
+    last_send = time.ticks_add(time.ticks_ms(), -LCD_MIN_INTERVAL_MS)
+    gap = LCD_MIN_INTERVAL_MS
+    while True:
+        await lcd_wake.wait()
+        lcd_wake.clear()
+        wait = gap - time.ticks_diff(time.ticks_ms(), last_send)
+        if wait > 0:
+            await asyncio.sleep_ms(wait)
+        line1, line2 = lcd_wanted
+        # Lines the LCD is already showing are left out of the frame
+        if line1 == lcd_sent[0]:
+            line1 = None
+        if line2 == lcd_sent[1]:
+            line2 = None
+        if line1 is None and line2 is None:
+            continue
+        started = metrics.start()
+        n = lcd_proto.encode_lines(lcd_buf, line1, line2)
+        last_send = time.ticks_ms()
+        try:
+            delivered = await e.asend(peer, lcd_view[:n])
+        except OSError as ex:
+            print("ESP-NOW error:", ex)
+            delivered = False
+        metrics.stop(LCD_SEND_US, started)
+        if delivered:
+            gap = LCD_MIN_INTERVAL_MS
+            if line1 is not None:
+                lcd_sent[0] = line1
+            if line2 is not None:
+                lcd_sent[1] = line2
+        else:
+            # Unknown what the LCD shows now, so send both lines again,
+            # waiting longer after every frame that goes unanswered
+            gap = min(gap * 2, LCD_MAX_BACKOFF_MS)
+            lcd_sent[0] = lcd_sent[1] = None
+            lcd_wake.set()
 
 # --- Bomb Countdown Logic ---
-def bomb():
-    global cnt, current_delay, armed
-    cnt = True
+COUNTDOWN_MS = 45000
+START_INTERVAL_MS = 1000
+END_INTERVAL_MS = 50
+
+# Collect garbage only at safe points (see heap.py) rather than whenever an
+# allocation runs out of room
+MANAGE_GC = True
+
+# Hot path timings, served at /metrics (see metrics.py)
+TICK_US = metrics.histogram("bomb_tick_us", "Countdown tick work, beep to sleep")
+TICK_LATE_US = metrics.histogram("bomb_tick_late_us", "Countdown tick wake-up lateness, ms resolution")
+# The beeps come fastest at the end, where a late one is easiest to hear
+ENDGAME_MS = 10000
+ENDGAME_LATE_US = metrics.histogram("bomb_endgame_tick_late_us", "Tick lateness in the last 10 s of the countdown")
+DISARM_US = metrics.histogram("bomb_disarm_tick_us", "Disarm ticker iteration")
+LCD_SEND_US = metrics.histogram("bomb_lcd_send_us", "LCD frame encode and ESP-NOW send")
+HTTP_US = metrics.histogram("bomb_http_request_us", "HTTP route handling")
+
+# How late countdown ticks fired behind their deadline, in ms
+tick_late_max = 0
+tick_late_avg = 0
+# When the countdown next wakes up to beep
+tick_due = 0
+
+def beep_interval(elapsed):
+    """Time between beeps, shrinking linearly over the countdown."""
+    return max(END_INTERVAL_MS, START_INTERVAL_MS - (START_INTERVAL_MS - END_INTERVAL_MS) * elapsed // COUNTDOWN_MS)
+
+def catch_up_ms(interval):
+    """How much sooner than `interval` a beep may follow a late one to get
+    back on schedule; later than that, the schedule starts over.
+    """
+    return interval // 4
+
+def slack_ms():
+    """Time until the countdown's next beep; None if it is not running."""
+    return time.ticks_diff(tick_due, time.ticks_ms()) if state.counting() else None
+
+async def bomb():
+    """Runs the countdown that state.start_countdown() began."""
+    global tick_late_max, tick_late_avg, tick_due
     update_lcd("COUNTDOWN", "ACTIVATED")
 
-    total_time = 45
-    start_interval = 1.0
-    end_interval = 0.05
-
-    start_beep()
-    start_time = time.time()
-
-    while cnt:
-        elapsed = time.time() - start_time
-        remaining = total_time - elapsed
+    player.play(START_BEEP, PRIO_BEEP)
+    # Every tick is scheduled against absolute deadlines measured from the
+    # end the pages count down to, so time spent beeping and sending does
+    # not push the countdown back.
+    end = state.countdown_end
+    start = time.ticks_add(end, -COUNTDOWN_MS)
+    wait = time.ticks_diff(start, time.ticks_ms())
+    if wait > 0:
+        await asyncio.sleep_ms(wait)
+    deadline = wake_at = start
+    late_max = 0
+    late_total = 0
+    ticks = 0
+
+    while state.counting():
+        started = metrics.start()
+        now = time.ticks_ms()
+        late = time.ticks_diff(now, wake_at)
+        late_max = max(late_max, late)
+        late_total += late
+        ticks += 1
+        remaining = time.ticks_diff(end, now)
+        history.log(journal.EV_TICK, min(late, 255), remaining)
+        metrics.record(TICK_LATE_US, late * 1000)
+        if remaining < ENDGAME_MS:
+            metrics.record(ENDGAME_LATE_US, late * 1000)
         if remaining <= 0:
             break
 
-        interval = max(end_interval, start_interval - ((start_interval - end_interval) * (elapsed / total_time)))
-        current_delay = f"{remaining:.1f} sec left"
-        if send_time:
-            update_lcd("NOCHANGE", f"Time: {remaining:05.1f}s ")
-        print(f"\rRemaining: {current_delay}", end='')
+        interval = beep_interval(time.ticks_diff(deadline, start))
+        # The disarm has the LCD while it is held
+        if state.phase != DISARMING:
+            update_lcd(None, f"Time: {remaining / 1000:05.1f}s ")
+        print(f"\rRemaining: {remaining / 1000:.1f} sec left", end='')
 
         beep()
-        time.sleep(interval)
-
-    if cnt:
-        print("\nFlat tone!")
-        flat_line(set_frq=True)
-        current_delay = "Flat Tone!"
+        deadline = time.ticks_add(deadline, interval)
+        now = time.ticks_ms()
+        if time.ticks_diff(deadline, now) < interval - catch_up_ms(interval):
+            # Too far behind to make it up; drop the missed beeps and give
+            # the next one a whole interval instead of firing it right away
+            deadline = time.ticks_add(now, interval)
+        wake_at = tick_due = deadline if time.ticks_diff(end, deadline) > 0 else end
+        metrics.stop(TICK_US, started)
+        # Between beeps is the one time a collection cannot delay one
+        heap.collect_within(time.ticks_diff(wake_at, time.ticks_ms()))
+        wait = time.ticks_diff(wake_at, time.ticks_ms())
+        if wait > 0:
+            await asyncio.sleep_ms(wait)
+
+    tick_late_max = late_max
+    tick_late_avg = late_total // ticks if ticks else 0
+    print(f"\nTick lateness: max {tick_late_max} ms, avg {tick_late_avg} ms, GC max pause {heap.max_pause_us} us")
+    if state.detonate():
+        print("Flat tone!")
+        flat_line()
         update_lcd("EXPLOSION", "DETONATED")
-    armed = False
     armed_led.off()
-    cnt = False
 
 # --- Physical Button Handling ---
-def button_thread():
-    global armed, cnt, arm_progress, arm_holding, last_switch_state, disarm_enabled, arming_started, allow_arm_control
-    global last_btn_state
-    
+async def button_task():
     while True:
-        switch_state = SWITCH.value()
-        btn_state = BTN.value()
-        
-        if not cnt:
-            # Both switch and button pressed
-            if not switch_state and not btn_state:
-                if not armed:
-                    if not arm_holding:
-                        # Start holding both
-                        arm_holding = True
-                        arm_progress = 0.0
-                        arming_started = True
-                        print("Switch + Button pressed - arming started")
-                        update_lcd("ARMING STARTED", "Hold switch+btn")
-                        beep()
-                    else:
-                        arm_progress += 0.1
-                        if arm_progress >= 4.0:
-                            armed = True
-                            armed_led.on()
-                            arm_holding = False
-                            arming_started = False
-                            print("Bomb Armed!")
-                            update_lcd("SYSTEM ARMED", "ACTIVATION READY")
-                            beep(); time.sleep(0.1); beep(); time.sleep(0.1); beep()
-            else:
-                if arm_holding:
-                    if arm_progress < 4.0 and not armed:
-                        print("Arming canceled")
-                        update_lcd("ARMING CANCELED", "")
-                        beep(); time.sleep(0.1); beep()
-                arm_holding = False
-                arm_progress = 0.0
-                arming_started = False
-        
-        # Disarm only if both switch and button are pressed
-        disarm_enabled = cnt and (not switch_state and not btn_state)
-        allow_arm_control = not switch_state
-        
-        last_switch_state = switch_state
-        last_btn_state = btn_state
-        time.sleep(0.1)
-
-_thread.start_new_thread(button_thread, ())
+        switch.settle()
+        btn.settle()
+        if state.set_inputs(switch.state, btn.state):
+            history.log(journal.EV_INPUT, switch.state << 1 | btn.state)
+
+        if not state.counting():
+            # Arming takes both switch and button
+            if state.keys_held():
+                if state.phase == ARMING:
+                    if state.arm_ms() >= ARM_HOLD_MS and state.arm():
+                        armed_led.on()
+                        print("Bomb Armed!")
+                        update_lcd("SYSTEM ARMED", "ACTIVATION READY")
+                        beep(ARMED_BEEP, PRIO_SIGNAL)
+                # Timed from the later press
+                elif state.start_arming(switch.since if time.ticks_diff(switch.since, btn.since) > 0 else btn.since):
+                    print("Switch + Button pressed - arming started")
+                    update_lcd("ARMING STARTED", "Hold switch+btn")
+                    beep(priority=PRIO_SIGNAL)
+            elif state.cancel_arming():
+                print("Arming canceled")
+                update_lcd("ARMING CANCELED", "")
+                beep(CANCEL_BEEP, PRIO_SIGNAL)
+
+        # Sleep until an input changes or the arming hold is complete
+        if state.phase == ARMING:
+            try:
+                await asyncio.wait_for_ms(input_flag.wait(), max(ARM_HOLD_MS - state.arm_ms(), 0))
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await input_flag.wait()
+        if switch.pending or btn.pending:
+            await asyncio.sleep_ms(DEBOUNCE_MS)
 
 # --- Web Hold Logic ---
-def disarm_progress_thread():
-    global disarm_progress, disarm_active, cnt, current_delay, armed, do_beep, send_time
+# The hold is timed by state.disarm_ms(), so how often this runs only
+# changes how often the buzzer ticks and the LCD moves, not how long
+# the disarm takes.
+DISARM_FEEDBACK_MS = 50
 
+async def disarm_task():
     while True:
-        if cnt and disarm_enabled:
-            if disarm_active:
-                send_time = False
-                disarm_progress += 0.05
-                update_lcd("DISARMING...", f"{disarm_progress:.2f}/7.0")
-                if disarm_progress >= 3.5:
-                    buzzer.freq(1500)   # a little bit higher pitch
-                else:
-                    buzzer.freq(1000)
-                buzzer.duty_u16(2500)
-                buzzer_led.on()
-                time.sleep(0.03)
-                buzzer.duty_u16(0)
-                buzzer_led.off()
-                buzzer.freq(1000)
-                if disarm_progress >= 7:
-                    print("\nBomb disarmed!")
-                    # Reset everything
-                    disarm_progress = 0
-                    disarm_active = False
-                    cnt = False
-                    armed = False
-                    armed_led.off()
-                    current_delay = "Disarmed"
-                    update_lcd("SYSTEM DISARMED", "SAFE")
-                    
-                    beep(); time.sleep(0.05); beep()
-                    flat_line()
-                    time.sleep(0.5)
-                    buzzer.duty_u16(0)
-                    buzzer_led.off()
+        started = metrics.start()
+        wait = DISARM_FEEDBACK_MS
+        if state.phase == DISARMING:
+            held = state.disarm_ms()
+            if state.defuse():
+                print("\nBomb disarmed!")
+                armed_led.off()
+                update_lcd("SYSTEM DISARMED", "SAFE")
+                flat_line(DEFUSED)
             else:
-                # Reset progress if web button not held
-                update_lcd("DISARM ABORTED", "")
-                do_beep = True
-                send_time = True
-                disarm_progress = 3.5 if disarm_progress >= 3.5 else 0 if disarm_progress > 0 else disarm_progress
-        else:
-            disarm_progress = 0 if not cnt else 3.5 if disarm_progress >= 3.5 else 0
-            disarm_active = False
+                update_lcd("DISARMING...", f"{held / 1000:.2f}/7.0")
+                player.play(DISARM_TICK_HIGH if held >= DISARM_CHECKPOINT_MS else DISARM_TICK, PRIO_DISARM)
+                # Wake up right when the hold is complete
+                wait = min(wait, DISARM_HOLD_MS - held)
+        elif state.disarm_enabled():
+            # Keys held, but not the button on the page
+            update_lcd("DISARM ABORTED", "")
+        metrics.stop(DISARM_US, started)
+
+        wake_at = time.ticks_add(time.ticks_ms(), wait)
+        budget = slack_ms()
+        heap.collect_within(min(budget, wait) if state.phase == DISARMING else budget)
+        wait = time.ticks_diff(wake_at, time.ticks_ms())
+        if wait > 0:
+            await asyncio.sleep_ms(wait)
+
+async def journal_task():
+    while True:
+        await asyncio.sleep_ms(JOURNAL_FLUSH_MS)
+        # A flash write stalls everything, beeps included
+        if not state.counting():
+            history.flush()
 
-        time.sleep(0.02)
+# --- HTTP Server ---
+# Every connection is its own task, so a slow or stalled phone only holds
+# up itself; these bound how long it can hold on to a socket.
+REQUEST_TIMEOUT_MS = 2000
+SEND_TIMEOUT_MS = 500
+# Requests being answered at once; a connection only holds buffers while
+# it has one in hand, so idle keep-alive connections do not count
+MAX_CONNECTIONS = 8
+# Persistent connections save a TCP handshake per poll; a polling page asks
+# every 200 ms, and an idle one only ties up a socket
+KEEPALIVE_IDLE_MS = 2000
+KEEPALIVE_MAX_REQUESTS = 100
+# Largest body a route builds in place (/state is about 380 bytes)
+RESPONSE_SIZE = 512
+
+BUSY = b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+BAD_REQUEST = b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+TOO_LARGE = b"HTTP/1.1 431 Request Header Fields Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+# Request/response buffer pairs, allocated up front and lent to a
+# connection from the first byte of a request until it is answered. A
+# request that finds none free waits for one to come back, for as long as
+# it may take to arrive, and is then turned away.
+buffers = [(Request(), Response(RESPONSE_SIZE)) for _ in range(MAX_CONNECTIONS)]
+buffers_freed = asyncio.Event()
+
+async def take_buffers():
+    """A buffer pair, or None if none came free in time."""
+    while not buffers:
+        buffers_freed.clear()
+        try:
+            await asyncio.wait_for_ms(buffers_freed.wait(), REQUEST_TIMEOUT_MS)
+        except asyncio.TimeoutError:
+            return None
+    return buffers.pop()
 
-_thread.start_new_thread(disarm_progress_thread, ())
+def give_back(slot):
+    buffers.append(slot)
+    buffers_freed.set()
 
-# --- HTTP Server ---
-def start_server():
+async def start_server(port=80):
     while True:
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.bind(("0.0.0.0", 80))
-            s.listen(5)
-
-            while True:
-                conn, addr = s.accept()
-                request = conn.recv(1024).decode()
-                response = handle_request(request)
-                conn.send(response)
-                conn.close()
-        except OSError as e:
-            print("Server error:", e)
-            try: s.close()
-            except: pass
-            time.sleep(1)
-
-def handle_request(request):
-    global armed, cnt, current_delay, disarm_active, disarm_enabled, disarm_progress, arm_progress, arming_started, flat_tone, do_beep, allow_arm_control
-    if "/hold_start" in request and disarm_enabled:
-        disarm_active = True
-        do_beep = False
-        return b"HTTP/1.1 200 OK\r\n\r\nStarted"
-    elif "/hold_stop" in request:
-        disarm_active = False
-        do_beep = True
-        return b"HTTP/1.1 200 OK\r\n\r\nStopped"
-    elif "/progress" in request:
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{7 - disarm_progress:.2f}".encode()
-    elif "/armprogress" in request:
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{arm_progress:.1f}".encode()
-    elif "/reset" in request and not cnt and flat_tone:
-        armed = False
-        cnt = False
-        flat_tone = False
-        current_delay = "Disarmed"
-        armed_led.off()
-        buzzer.freq(1000)
-        do_beep = True
-        update_lcd("SYSTEM RESET", "READY")
-        beep()
-        return b"HTTP/1.1 200 OK\r\n\r\nReset"
-    elif "/showreset" in request:
-        data = "YES" if not cnt and flat_tone else "NO"
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{data}".encode()
-    elif "/activate" in request and armed and not cnt:
-        print("Bomb Activated via web!")
-        _thread.start_new_thread(bomb, ())
-        return b"HTTP/1.1 200 OK\r\n\r\nActivated"
-    elif "/disarm" in request and armed and not cnt:
-        armed = False
-        armed_led.off()
-        print("Bomb Disarmed via web!")
-        update_lcd("SYSTEM DISARMED", "SAFE")
-        beep(); time.sleep(0.1); beep(); time.sleep(0.1); beep(); time.sleep(0.1); beep()
-        return b"HTTP/1.1 200 OK\r\n\r\nDisarmed"
-    elif "/status" in request:
-        status = "Armed" if armed else "Disarmed"
-        if cnt:
-            status += " - Countdown Running"
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{status}".encode()
-    elif "/statdisarm" in request:
-        status = "SHOW_DISARM" if disarm_enabled else ""
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{status}".encode()
-    elif "/delay" in request:
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{current_delay}".encode()
-    elif "/hidedelay" in request:
-        data = "NO" if cnt else "YES"
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{data}".encode()
-    elif "/armingstatus" in request:
-        status = "ARMING" if (arming_started and not cnt and not armed) else "NOT"
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{status}".encode()
-    elif "/buttoninstructions" in request:
-        if cnt:
-            instructions = ""
-        elif armed and not allow_arm_control:
-            instructions = "Use the buttons below"
-        elif arming_started and not (SWITCH.value() or BTN.value()) and not armed:
-            instructions = "Hold the button"
-        elif arming_started:
-            instructions = "Arming in progress..."
-        elif SWITCH.value():
-            instructions = "Turn the switch"
-        elif not SWITCH.value() and BTN.value():
-            instructions = "Hold the button"
-        else:
-            instructions = "Turn switch off and remove keys"
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{instructions}".encode()
-    elif "/armedstatus" in request:
-        status = "ARMED" if (armed and not cnt and not allow_arm_control) else "NOT"
-        return f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n{status}".encode()
-    return (b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n" + generate_html().encode())
-
-def generate_html():
-    global disarm_enabled
-    if disarm_enabled:
-        page = """\
-<!DOCTYPE html>
-<html>
-<head>
-<title>Disarm the Bomb</title>
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<style>
-/* For mobile devices */
-@media only screen and (max-width: 600px) {
-    body { font-size: 18px; }
-    #hold { padding: 30px; font-size: 28px; }
-    #delay, #prog { font-size: 24px; }
-    .disarm-progress-bar { 
-        width: 90%; 
-        height: 40px; 
+            return await asyncio.start_server(handle_client, "0.0.0.0", port, backlog=5)
+        except OSError as ex:
+            print("Server error:", ex)
+            await asyncio.sleep(1)
+
+async def read_request(reader, req):
+    """Reads the next request head into `req`'s buffer and parses it there.
+    Returns False if the client closed the connection instead.
+    """
+    req.next()
+    # Pipelined requests may already be in the buffer
+    while not req.scan():
+        if req.full():
+            raise ValueError("request too large")
+        # A slice of the view is only needed to append to a partial head
+        n = await reader.readinto(req.view[req.n:] if req.n else req.buf)
+        if not n:
+            return False
+        req.n += n
+    req.match(PATHS)
+    return True
+
+async def send_chunks(writer, chunks):
+    """Writes a streamed body. The chunks may share a buffer, so each one
+    is drained before the next is asked for.
+    """
+    try:
+        for part in chunks:
+            writer.write(part)
+            await asyncio.wait_for_ms(writer.drain(), SEND_TIMEOUT_MS)
+    finally:
+        chunks.close()
+
+async def handle_client(reader, writer):
+    slot = None
+    # Where an idle connection reads the first byte of its next request
+    first = bytearray(1)
+    try:
+        # Requests are answered in order, so pipelined ones just wait in
+        # the buffer until their turn.
+        for served in range(KEEPALIVE_MAX_REQUESTS):
+            if slot is None:
+                timeout = REQUEST_TIMEOUT_MS if served == 0 else KEEPALIVE_IDLE_MS
+                if not await asyncio.wait_for_ms(reader.readinto(first), timeout):
+                    break
+                slot = await take_buffers()
+                if slot is None:
+                    writer.write(BUSY)
+                    await asyncio.wait_for_ms(writer.drain(), SEND_TIMEOUT_MS)
+                    break
+                req, resp = slot
+                req.begin(first[0])
+            try:
+                if not await asyncio.wait_for_ms(read_request(reader, req), REQUEST_TIMEOUT_MS):
+                    break
+            except ValueError as ex:
+                # The head does not parse or does not fit the buffer; say
+                # which, since the rest of the stream cannot be trusted
+                print("Bad request:", ex)
+                writer.write(TOO_LARGE if req.full() else BAD_REQUEST)
+                await asyncio.wait_for_ms(writer.drain(), SEND_TIMEOUT_MS)
+                break
+            # Nothing takes a body; skip it to reach the next request
+            rest = req.skip_body()
+            if rest:
+                await asyncio.wait_for_ms(reader.readexactly(rest), REQUEST_TIMEOUT_MS)
+            if req.path == b"/events":
+                # A stream needs no buffers; hand them to the next phone
+                give_back(slot)
+                slot = None
+                if await start_events(writer):
+                    await follow_events(reader, writer)
+                break
+            handle_request(req, resp)
+            streamed = resp.chunks is not None
+            persist = req.keep_alive() and served < KEEPALIVE_MAX_REQUESTS - 1 and not streamed
+            writer.write(resp.finish(persist, resp.status != NOT_MODIFIED and not streamed))
+            if resp.data is not None:
+                # Only the pages; the stream buffers both for one drain
+                writer.write(resp.data)
+            elif streamed:
+                await send_chunks(writer, resp.chunks)
+            await asyncio.wait_for_ms(writer.drain(), SEND_TIMEOUT_MS)
+            heap.collect_within(slack_ms())
+            if not persist:
+                break
+            if not req.pending():
+                give_back(slot)
+                slot = None
+    except asyncio.TimeoutError:
+        pass
+    except (OSError, ValueError) as ex:
+        print("Client error:", ex)
+    finally:
+        if slot is not None:
+            give_back(slot)
+        writer.close()
+        await writer.wait_closed()
+
+# --- Page State ---
+def disarm_left():
+    """Hold time still needed to disarm, in hundredths of a second."""
+    return (DISARM_HOLD_MS - state.disarm_ms()) // 10
+
+def delay_text():
+    """The countdown as text, for the console and the /delay route."""
+    if not state.counting():
+        return state.delay
+    return b"%.1f sec left" % (min(state.countdown_ms(), COUNTDOWN_MS) / 1000)
+
+# The pages count the countdown and the holds themselves, from the ticks
+# they started or end at and "now", the server's ticks when the state was
+# sent; these only change on transitions. The durations and the beep
+# schedule are sent along so the pages do not hard-code them.
+def state_dict():
+    """Everything the control and disarm pages display."""
+    return {
+        "phase": PHASE_NAMES[state.phase].decode(),
+        "status": state.status_text().decode(),
+        "instructions": state.button_instructions().decode(),
+        "controls": state.show_controls(),
+        "reset": state.show_reset(),
+        "countdown": state.counting(),
+        "arming": state.show_arming(),
+        "disarm": state.disarm_enabled(),
+        "now": time.ticks_ms(),
+        "deadline": state.countdown_end,
+        "countdown_ms": COUNTDOWN_MS,
+        "interval_start": START_INTERVAL_MS,
+        "interval_end": END_INTERVAL_MS,
+        "arm_start": state.arm_start,
+        "arm_ms": ARM_HOLD_MS,
+        "holding": state.phase == DISARMING,
+        "hold_start": state.disarm_start,
+        "held": state.disarm_banked,
+        "hold_ms": DISARM_HOLD_MS,
     }
-}
-.disarm-progress-bar { 
-    width: 300px; 
-    height: 30px; 
-    border: 2px solid #333; 
-    margin: 10px auto; 
-    background-color: #f0f0f0; 
-}
-.disarm-progress-fill { 
-    height: 100%; 
-    background-color: #4CAF50; 
-    width: 0%; 
-    transition: width 0.1s;
-}
-</style>
-</head>
-<body style="font-family:Arial; text-align:center;">
-<h1 style="color:red;">Bomb Active!</h1>
-<p>Hold the button below while keeping the disarm switch on!</p>
-<p id="delay">Remaining: {}</p>
-<button id="hold" style="padding:20px; font-size:22px;"
-    onmousedown="startHold()" onmouseup="stopHold()"
-    ontouchstart="startHold()" ontouchend="stopHold()">Hold to Disarm</button>
-<div class="disarm-progress-bar">
-    <div id="disarmBar" class="disarm-progress-fill"></div>
-</div>
-<p id="prog">Progress: <span id="disarmTime">{}</span>s remaining</p>
-
-<script>
-let interval=null;
-
-function startHold(){ fetch('/hold_start'); interval = setInterval(updateProgress, 200); }
-function stopHold(){ fetch('/hold_stop'); clearInterval(interval); }
-
-function updateProgress(){ 
-    fetch('/progress').then(r=>r.text()).then(d=>{ 
-        document.getElementById('disarmTime').innerText = d;
-        let progressPercent = Math.min(100, ((7 - d) / 7) * 100);
-        document.getElementById('disarmBar').style.width = progressPercent + '%';
-    });
-    fetch('/delay').then(r=>r.text()).then(d=>{ document.getElementById('delay').innerText = "Remaining: " + d; });
-}
 
-setInterval(()=>{ fetch('/statdisarm').then(r=>r.text()).then(data=>{ if(!data.includes("SHOW_DISARM")){ setTimeout(() => { location.reload(); }, 1000); }; }); }, 500);
-
-setInterval(updateProgress, 500);
-</script>
-</body>
-</html>
-"""
-    else:
-        page = """\
-<!DOCTYPE html>
-<html>
-<head>
-<title>ESP32 Control Panel</title>
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<style>
-body { font-family: Arial; text-align: center; justify-content: center; align-items: center;}
-.btn { padding: 15px; font-size: 20px; margin: 5px; }
-#status { font-size: 24px; font-weight: bold; margin-top: 20px; }
-#delay { font-size: 20px; font-weight: bold; color: red; margin-top: 10px; }
-#instructions { font-size: 18px; margin: 15px 0; color: #555; }
-.progress-bar { 
-    width: 300px; 
-    height: 30px; 
-    border: 2px solid #333; 
-    margin: 10px auto; 
-    background-color: #f0f0f0; 
-    display: none;
-}
-.progress-fill { 
-    height: 100%; 
-    background-color: #4CAF50; 
-    width: 0%; 
-    transition: width 0.1s;
-}
-.armed-controls { 
-    display: none; 
-    margin: 15px 0;
-}
-/* For mobile devices */
-@media only screen and (max-width: 600px) {
-    body { font-size: 18px; }
-    .btn { padding: 20px; font-size: 24px; }
-    #status { font-size: 28px; }
-    #delay { font-size: 24px; }
-    #instructions { font-size: 22px; }
-    .progress-bar { 
-        width: 90%; 
-        height: 40px; 
-    }
-}
-</style>
-</head>
-<body>
-<h1>Bomb Control</h1>
-
-<div id="rst">
-<button class="btn" onclick="sendCommand('/reset')">RESET</button>
-</div>
-<p id="disarm">Turn the disarm switch to enable the disarm page</p>
-<p id="status">Disarmed</p>
-<p id="delay">Remaining: {}</p>
-<p id="instructions"></p>
-
-<div id="armedControls" class="armed-controls">
-    <button class="btn" style="background-color: #4CAF50;" onclick="sendCommand('/activate')">ACTIVATE</button>
-    <button class="btn" style="background-color: #f44336;" onclick="sendCommand('/disarm')">DISARM</button>
-</div>
-
-<div id="armingProgress" class="progress-bar">
-    <div id="armingBar" class="progress-fill"></div>
-</div>
-<p id="armingText" style="display: none;">Keep switch on: <span id="armingTime">0.0</span>s / 4.0s</p>
-
-<script>
-function sendCommand(url){ fetch(url).then(updateStatus); }
-function updateStatus(){ 
-    fetch('/status').then(r=>r.text()).then(d=>{
-        document.getElementById('status').innerText = d;
-        // Update status color based on state
-        if(d.includes("Armed")) {
-            document.getElementById('status').style.color = "orange";
-            if(d.includes("-")) {
-                document.getElementById('status').style.color = "red";
-            }
-        } else {
-            document.getElementById('status').style.color = "green";
-        }
-    });
-    fetch('/delay').then(r=>r.text()).then(d=>document.getElementById('delay').innerText="Remaining: "+d);
-    
-    // Update button instructions
-    fetch('/buttoninstructions').then(r=>r.text()).then(instructions=>{
-        document.getElementById('instructions').innerText = instructions;
-    });
-    
-    // Check armed status to show/hide controls
-    fetch('/armedstatus').then(r=>r.text()).then(data=>{
-        if(data.includes("ARMED")) {
-            document.getElementById('armedControls').style.display = 'block';
-        } else {
-            document.getElementById('armedControls').style.display = 'none';
-        }
-    });
-    
-    fetch('/showreset').then(r=>r.text()).then(data=>{
-        if(data.includes("YES")) {
-            document.getElementById('rst').style.display = 'block';
-        } else {
-            document.getElementById('rst').style.display = 'none';
-        }
-    });
-    
-    fetch('/hidedelay').then(r=>r.text()).then(data=>{
-        if(data.includes("NO")) {
-            document.getElementById('delay').style.display = 'block';
-            document.getElementById('disarm').style.display = 'block';
-        } else {
-            document.getElementById('delay').style.display = 'none';
-            document.getElementById('disarm').style.display = 'none';
-        }
-    });
-    
-    // Check arming status (only show if not in countdown and not armed)
-    fetch('/armingstatus').then(r=>r.text()).then(data=>{
-        if(data.includes("ARMING") && !document.getElementById('status').innerText.includes("Armed")) {
-            document.getElementById('armingProgress').style.display = 'block';
-            document.getElementById('armingText').style.display = 'block';
-            fetch('/armprogress').then(r=>r.text()).then(progress=>{
-                let progressPercent = Math.min(100, (progress / 4.0) * 100);
-                document.getElementById('armingBar').style.width = progressPercent + '%';
-                document.getElementById('armingTime').innerText = progress;
-            });
-        } else {
-            document.getElementById('armingProgress').style.display = 'none';
-            document.getElementById('armingText').style.display = 'none';
-        }
-    });
+def state_json():
+    return json.dumps(state_dict())
+
+def write_state(resp):
+    """Writes state_dict() as JSON into a response without building it."""
+    resp.add(b'{"phase": "')
+    resp.add(PHASE_NAMES[state.phase])
+    resp.add(b'", "status": "')
+    resp.add(state.status_text())
+    resp.add(b'", "instructions": "')
+    resp.add(state.button_instructions())
+    resp.add(b'", "controls": ')
+    resp.add_bool(state.show_controls())
+    resp.add(b', "reset": ')
+    resp.add_bool(state.show_reset())
+    resp.add(b', "countdown": ')
+    resp.add_bool(state.counting())
+    resp.add(b', "arming": ')
+    resp.add_bool(state.show_arming())
+    resp.add(b', "disarm": ')
+    resp.add_bool(state.disarm_enabled())
+    resp.add(b', "now": ')
+    resp.add_int(time.ticks_ms())
+    resp.add(b', "deadline": ')
+    resp.add_int(state.countdown_end)
+    resp.add(b', "countdown_ms": ')
+    resp.add_int(COUNTDOWN_MS)
+    resp.add(b', "interval_start": ')
+    resp.add_int(START_INTERVAL_MS)
+    resp.add(b', "interval_end": ')
+    resp.add_int(END_INTERVAL_MS)
+    resp.add(b', "arm_start": ')
+    resp.add_int(state.arm_start)
+    resp.add(b', "arm_ms": ')
+    resp.add_int(ARM_HOLD_MS)
+    resp.add(b', "holding": ')
+    resp.add_bool(state.phase == DISARMING)
+    resp.add(b', "hold_start": ')
+    resp.add_int(state.disarm_start)
+    resp.add(b', "held": ')
+    resp.add_int(state.disarm_banked)
+    resp.add(b', "hold_ms": ')
+    resp.add_int(DISARM_HOLD_MS)
+    resp.add(b'}')
+
+# --- State Push ---
+# Pages subscribe to /events (Server-Sent Events) and are sent the fields of
+# state_dict() that changed, instead of polling /state. Pushes are at
+# least PUSH_INTERVAL_MS apart.
+PUSH_INTERVAL_MS = 50
+PING_INTERVAL_MS = 15000
+# Every stream holds a socket open; the ESP32 only has a handful
+MAX_EVENT_CLIENTS = 6
+
+event_clients = []
+
+async def start_events(writer):
+    """Turns the connection into an event stream, starting with the full
+    state. Returns False if it was refused and should be closed.
+    """
+    if len(event_clients) >= MAX_EVENT_CLIENTS:
+        writer.write(BUSY)
+        await asyncio.wait_for_ms(writer.drain(), SEND_TIMEOUT_MS)
+        return False
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n")
+    writer.write(f"data: {state_json()}\n\n".encode())
+    await asyncio.wait_for_ms(writer.drain(), SEND_TIMEOUT_MS)
+    event_clients.append(writer)
+    return True
+
+async def follow_events(reader, writer):
+    """Holds the stream's slot in event_clients until the phone closes
+    the connection; a reloading page frees its slot at once instead of at
+    the next failed push.
+    """
+    try:
+        # Phones send nothing more on a stream; this only ends at EOF
+        while await reader.read(16):
+            pass
+    except OSError:
+        pass
+    finally:
+        drop_events(writer)
+
+def drop_events(writer):
+    if writer in event_clients:
+        event_clients.remove(writer)
+        writer.close()
+
+async def push_to(writer, msg):
+    """Sends `msg` to one stream, dropping the stream if it fails or stalls."""
+    try:
+        writer.write(msg)
+        await asyncio.wait_for_ms(writer.drain(), SEND_TIMEOUT_MS)
+    except (OSError, asyncio.TimeoutError):
+        drop_events(writer)
+
+async def state_pusher():
+    pushed = {}
+    last_push = time.ticks_ms()
+    while True:
+        # Sleep until the state changes; time passing is not a change
+        try:
+            await asyncio.wait_for_ms(state_changed.wait(), PING_INTERVAL_MS)
+        except asyncio.TimeoutError:
+            pass
+        state_changed.clear()
+        if not event_clients:
+            continue
+        current = state_dict()
+        delta = {}
+        for key, value in current.items():
+            if pushed.get(key) != value and key != "now":
+                delta[key] = value
+        pushed = current
+        now = time.ticks_ms()
+        if delta:
+            # Every push carries the clock the ticks in it are read against
+            delta["now"] = current["now"]
+            msg = f"data: {json.dumps(delta)}\n\n".encode()
+        elif time.ticks_diff(now, last_push) >= PING_INTERVAL_MS:
+            # Comment line; keeps the stream alive and finds dead clients
+            msg = b": ping\n\n"
+        else:
+            continue
+        last_push = now
+        # All streams at once, so a stalled phone only holds up itself
+        await asyncio.gather(*[push_to(writer, msg) for writer in event_clients])
+        # Changes in quick succession go out together in the next push
+        await asyncio.sleep_ms(PUSH_INTERVAL_MS)
+
+# --- Pages ---
+# The pages are static; they are loaded once at startup, preferring the
+# gzip copies made by build_pages.py, and revalidated by ETag. A gzip copy
+# ends with the CRC-32 and length of what it unpacks to, so one left over
+# from before the page was edited is noticed and the plain file served.
+def load_page(name):
+    """Returns (plain body, body, etag, extra headers) for a page file;
+    the body is the gzipped copy when there is an up to date one.
+    """
+    with open(name, "rb") as f:
+        plain = f.read()
+    try:
+        with open(name + ".gz", "rb") as f:
+            body = f.read()
+        if body[-8:] != struct.pack("<II", binascii.crc32(plain), len(plain) & 0xffffffff):
+            print(name + ".gz is out of date; serving " + name)
+            raise OSError
+        headers = b"Content-Encoding: gzip\r\nVary: Accept-Encoding\r\n"
+    except OSError:
+        body = plain
+        headers = b""
+    etag = b'"%08x"' % binascii.crc32(body)
+    return plain, body, etag, b"ETag: " + etag + b"\r\nCache-Control: no-cache\r\n" + headers
+
+control_page = load_page("control.html")
+disarm_page = load_page("disarm.html")
+
+# --- Routes ---
+# Each route fills in the connection's Response rather than returning one
+OK = b"200 OK"
+NOT_MODIFIED = b"304 Not Modified"
+NOT_FOUND = b"404 Not Found"
+NOT_ALLOWED = b"405 Method Not Allowed"
+CONFLICT = b"409 Conflict"
+
+TEXT = b"text/plain"
+JSON = b"application/json"
+HTML = b"text/html"
+
+STATE_HEADERS = b"Cache-Control: no-cache\r\n"
+
+def text(resp, body, status=OK):
+    resp.start(status, TEXT)
+    resp.add(body)
+
+def route_hold_start(req, resp):
+    if not state.hold():
+        return text(resp, b"Disarm not enabled", CONFLICT)
+    text(resp, b"Started")
+
+def route_hold_stop(req, resp):
+    state.release()
+    text(resp, b"Stopped")
+
+def route_reset(req, resp):
+    if not state.reset():
+        return text(resp, b"Nothing to reset", CONFLICT)
+    armed_led.off()
+    update_lcd("SYSTEM RESET", "READY")
+    player.stop()
+    beep(priority=PRIO_SIGNAL)
+    text(resp, b"Reset")
+
+def route_activate(req, resp):
+    global countdown
+    # The countdown proper starts after the start beeps
+    if not state.start_countdown(time.ticks_add(time.ticks_ms(), pattern_ms(START_BEEP) + COUNTDOWN_MS)):
+        return text(resp, b"Not armed", CONFLICT)
+    print("Bomb Activated via web!")
+    countdown = asyncio.create_task(bomb())
+    text(resp, b"Activated")
+
+def route_disarm(req, resp):
+    if not state.disarm():
+        return text(resp, b"Not armed", CONFLICT)
+    armed_led.off()
+    print("Bomb Disarmed via web!")
+    update_lcd("SYSTEM DISARMED", "SAFE")
+    beep(DISARMED_BEEP, PRIO_SIGNAL)
+    text(resp, b"Disarmed")
+
+def route_state(req, resp):
+    # Unchanged since the poller's last copy is answered from the version
+    # alone; its "now" is older, but the ticks it goes with are the same.
+    etag = state.state_etag()
+    if req.etag_matches(etag):
+        return resp.start(NOT_MODIFIED, JSON, STATE_HEADERS, etag)
+    resp.start(OK, JSON, STATE_HEADERS, etag)
+    write_state(resp)
+
+def route_progress(req, resp):
+    resp.start(OK, TEXT)
+    resp.add_fixed(disarm_left(), 2)
+
+def route_armprogress(req, resp):
+    resp.start(OK, TEXT)
+    resp.add_fixed(state.arm_ms() // 100, 1)
+
+def route_showreset(req, resp):
+    text(resp, b"YES" if state.show_reset() else b"NO")
+
+def route_status(req, resp):
+    text(resp, state.status_text())
+
+def route_statdisarm(req, resp):
+    text(resp, b"SHOW_DISARM" if state.disarm_enabled() else b"")
+
+def route_delay(req, resp):
+    text(resp, delay_text())
+
+def route_hidedelay(req, resp):
+    text(resp, b"NO" if state.counting() else b"YES")
+
+def route_armingstatus(req, resp):
+    text(resp, b"ARMING" if state.show_arming() else b"NOT")
+
+def route_buttoninstructions(req, resp):
+    text(resp, state.button_instructions())
+
+def route_armedstatus(req, resp):
+    text(resp, b"ARMED" if state.show_controls() else b"NOT")
+
+def route_heap(req, resp):
+    resp.start(OK, JSON)
+    resp.add(b'{"managed": ')
+    resp.add_bool(heap.enabled)
+    resp.add(b', "free": ')
+    resp.add_int(gc.mem_free())
+    resp.add(b', "alloc": ')
+    resp.add_int(gc.mem_alloc())
+    resp.add(b', "collections": ')
+    resp.add_int(heap.collections)
+    resp.add(b', "last_pause_us": ')
+    resp.add_int(heap.last_pause_us)
+    resp.add(b', "max_pause_us": ')
+    resp.add_int(heap.max_pause_us)
+    resp.add(b', "tick_late_max_ms": ')
+    resp.add_int(tick_late_max)
+    resp.add(b'}')
+
+def route_metrics(req, resp):
+    resp.start(OK, b"text/plain; version=0.0.4")
+    resp.data = metrics.render()
+
+def route_journal(req, resp):
+    resp.start(OK, b"application/octet-stream")
+    # Up to 32 KB; sent through the response's own buffer once the head
+    # is out, rather than read into RAM whole
+    resp.chunks = history.read(resp.body)
+
+def route_page(req, resp):
+    plain, body, etag, headers = disarm_page if state.disarm_enabled() else control_page
+    if req.etag_matches(etag):
+        return resp.start(NOT_MODIFIED, HTML, headers)
+    if body is not plain and not req.gzip:
+        body = plain
+        headers = b""
+    resp.start(OK, HTML, headers)
+    resp.data = body
+
+# Exact request paths, without the query string
+ROUTES = {
+    b"/": route_page,
+    b"/hold_start": route_hold_start,
+    b"/hold_stop": route_hold_stop,
+    b"/reset": route_reset,
+    b"/activate": route_activate,
+    b"/disarm": route_disarm,
+    b"/state": route_state,
+    b"/progress": route_progress,
+    b"/armprogress": route_armprogress,
+    b"/showreset": route_showreset,
+    b"/status": route_status,
+    b"/statdisarm": route_statdisarm,
+    b"/delay": route_delay,
+    b"/hidedelay": route_hidedelay,
+    b"/armingstatus": route_armingstatus,
+    b"/buttoninstructions": route_buttoninstructions,
+    b"/armedstatus": route_armedstatus,
+    b"/heap": route_heap,
+    b"/journal": route_journal,
+    b"/metrics": route_metrics,
 }
 
-// Update status immediately on page load
-updateStatus();
-
-setInterval(()=>{ fetch('/statdisarm').then(r=>r.text()).then(data=>{ if(data.includes("SHOW_DISARM")){ setTimeout(() => { location.reload(); }, 1000); }; }); }, 500);
+# Every path the server answers; a request for any other is matched to None
+PATHS = tuple(ROUTES) + (b"/events",)
 
-setInterval(updateStatus, 200);
-</script>
-</body>
-</html>
-"""
-    return page
+COMMAND_IDS = {path: i for i, path in enumerate(journal.COMMANDS)}
 
-update_lcd("SYSTEM ONLINE", "READY")
-
-_thread.start_new_thread(start_server, ())
+@metrics.timed(HTTP_US)
+def handle_request(req, resp):
+    """Runs the route for the request, which fills in `resp`."""
+    route = ROUTES.get(req.path)
+    if route is None:
+        text(resp, b"Not found", NOT_FOUND)
+    elif not req.get:
+        text(resp, b"GET only", NOT_ALLOWED)
+    else:
+        route(req, resp)
+    command = COMMAND_IDS.get(req.path)
+    if command is not None:
+        history.log(journal.EV_COMMAND, command, int(resp.status[:3]))
+
+async def main(port=80):
+    if MANAGE_GC:
+        heap.setup()
+    history.log(journal.EV_BOOT, 0, journal.FORMAT)
+    # Button scanning, the disarm ticker, the LCD link, the HTTP server and
+    # any running countdown all share this one event loop.
+    tasks = [
+        asyncio.create_task(player.run()),
+        asyncio.create_task(lcd_sender()),
+        asyncio.create_task(button_task()),
+        asyncio.create_task(disarm_task()),
+        asyncio.create_task(state_pusher()),
+        asyncio.create_task(journal_task()),
+    ]
+    update_lcd("SYSTEM ONLINE", "READY")
+    server = await start_server(port)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # Frees the port if the tasks are cancelled, as on the host
+        server.close()
+
+def run(port=80):
+    """Runs the bomb; never returns. Importing this module only sets it up."""
+    asyncio.run(main(port))
 
-# Keep main program alive
-while True:
-    time.sleep(1)
@@ -0,0 +1,249 @@
+# Game state of the bomb, in one object rather than a dozen globals.
+#
+#   IDLE -> ARMING -> ARMED -> COUNTDOWN <-> DISARMING -> DEFUSED
+#             |         |          |
+#             v         v          v
+#            IDLE      IDLE    DETONATED
+#
+# DETONATED and DEFUSED leave the alarm sounding (flat_tone) until reset();
+# a new round can be armed from them, as from IDLE. Every change bumps
+# `version`, and the texts the pages show are derived once per version, so
+# whoever polls or pushes can tell that nothing changed from one number.
+# Nothing here touches the hardware; bomb_new makes the beeps, LEDs and LCD
+# updates that go with each transition.
+#
+# The countdown and the arming and disarm holds are kept as the ticks_ms
+# they started or end at, not counted in loop iterations, so they take the
+# time they say however busy the board is, and time passing is not a
+# change: the pages are sent these ticks once and do the counting.
+import os
+import time
+
+IDLE = 0
+ARMING = 1
+ARMED = 2
+COUNTDOWN = 3
+DISARMING = 4
+DETONATED = 5
+DEFUSED = 6
+
+PHASE_NAMES = (b"IDLE", b"ARMING", b"ARMED", b"COUNTDOWN", b"DISARMING", b"DETONATED", b"DEFUSED")
+
+# Holding the disarm this long defuses the bomb. Letting go keeps the hold
+# time at the checkpoint if it got that far, and loses it otherwise.
+DISARM_HOLD_MS = 7000
+DISARM_CHECKPOINT_MS = 3500
+
+# Versions count from 0 again on every boot, so ETags carry this too; a
+# page that kept one from before a reboot then cannot match by chance
+BOOT_ID = int.from_bytes(os.urandom(4), "big")
+
+DISARMED = b"Disarmed"
+FLAT_TONE = b"Flat Tone!"
+
+
+class BombState:
+    __slots__ = ("phase", "version", "on_change", "flat_tone", "switch", "button",
+                 "arm_start", "countdown_end", "disarm_start", "disarm_banked", "delay", "views_version", "status",
+                 "instructions", "controls", "reset_shown", "arming_shown", "etag")
+
+    def __init__(self, on_change=None):
+        self.phase = IDLE
+        self.version = 0
+        # Called after every change
+        self.on_change = on_change
+        self.flat_tone = False
+        # Settled input levels; the pins pull up, so 0 is turned / pressed
+        self.switch = 1
+        self.button = 1
+        self.arm_start = 0
+        self.countdown_end = 0
+        # Ticks when the current disarm hold began, and hold time kept
+        # from earlier ones
+        self.disarm_start = 0
+        self.disarm_banked = 0
+        # What the countdown text reads when there is no countdown
+        self.delay = DISARMED
+        self.views_version = -1
+
+    def changed(self):
+        self.version += 1
+        if self.on_change is not None:
+            self.on_change()
+
+    def enter(self, phase):
+        self.phase = phase
+        self.changed()
+        return True
+
+    def armed(self):
+        return self.phase == ARMED or self.counting()
+
+    def counting(self):
+        return self.phase == COUNTDOWN or self.phase == DISARMING
+
+    def keys_held(self):
+        return not self.switch and not self.button
+
+    def disarm_enabled(self):
+        """Whether the disarm page is up: the keys are held in a countdown."""
+        return self.counting() and self.keys_held()
+
+    def arm_ms(self):
+        """How long the switch and button have been held for arming."""
+        if self.phase != ARMING:
+            return 0
+        return time.ticks_diff(time.ticks_ms(), self.arm_start)
+
+    def countdown_ms(self):
+        """Time left in the countdown; 0 when there is none."""
+        if not self.counting():
+            return 0
+        return max(time.ticks_diff(self.countdown_end, time.ticks_ms()), 0)
+
+    def disarm_ms(self):
+        """Disarm hold time so far, up to DISARM_HOLD_MS."""
+        if self.phase != DISARMING:
+            return self.disarm_banked
+        held = self.disarm_banked + time.ticks_diff(time.ticks_ms(), self.disarm_start)
+        return min(held, DISARM_HOLD_MS)
+
+    # Transitions; each returns False, changing nothing, if it does not apply
+
+    def set_inputs(self, switch, button):
+        """Records the settled switch and button levels."""
+        if switch == self.switch and button == self.button:
+            return False
+        self.switch = switch
+        self.button = button
+        if self.phase == DISARMING and not self.keys_held():
+            # Letting go of the keys lets go of the disarm
+            self.let_go()
+        self.changed()
+        return True
+
+    def start_arming(self, start):
+        """Starts the arming hold, timed from ticks `start`."""
+        if self.phase == ARMING or self.armed():
+            return False
+        self.arm_start = start
+        return self.enter(ARMING)
+
+    def cancel_arming(self):
+        return self.phase == ARMING and self.enter(IDLE)
+
+    def arm(self):
+        return self.phase == ARMING and self.enter(ARMED)
+
+    def disarm(self):
+        """Disarms an armed bomb whose countdown has not started."""
+        return self.phase == ARMED and self.enter(IDLE)
+
+    def start_countdown(self, end):
+        """Starts the countdown to ticks `end`."""
+        if self.phase != ARMED:
+            return False
+        self.countdown_end = end
+        self.disarm_banked = 0
+        return self.enter(COUNTDOWN)
+
+    def hold(self):
+        """The disarm button on the page is being held."""
+        if self.phase == DISARMING:
+            return True
+        if self.phase != COUNTDOWN or not self.keys_held():
+            return False
+        self.disarm_start = time.ticks_ms()
+        return self.enter(DISARMING)
+
+    def let_go(self):
+        """Ends the disarm hold, keeping the checkpoint if it was reached."""
+        held = self.disarm_ms()
+        self.disarm_banked = DISARM_CHECKPOINT_MS if held >= DISARM_CHECKPOINT_MS else 0
+        self.phase = COUNTDOWN
+
+    def release(self):
+        if self.phase != DISARMING:
+            return False
+        self.let_go()
+        self.changed()
+        return True
+
+    def detonate(self):
+        if not self.counting():
+            return False
+        self.flat_tone = True
+        self.delay = FLAT_TONE
+        self.disarm_banked = 0
+        return self.enter(DETONATED)
+
+    def defuse(self):
+        """Defuses the bomb once the disarm has been held long enough."""
+        if self.phase != DISARMING or self.disarm_ms() < DISARM_HOLD_MS:
+            return False
+        self.flat_tone = True
+        self.delay = DISARMED
+        self.disarm_banked = 0
+        return self.enter(DEFUSED)
+
+    def reset(self):
+        """Silences the alarm after a round. An arming hold carries on."""
+        if self.counting() or not self.flat_tone:
+            return False
+        self.flat_tone = False
+        self.delay = DISARMED
+        return self.enter(ARMING if self.phase == ARMING else IDLE)
+
+    # Views for the pages, derived once per version
+
+    def views(self):
+        if self.views_version == self.version:
+            return
+        phase = self.phase
+        if self.counting():
+            self.status = b"Armed - Countdown Running"
+        else:
+            self.status = b"Armed" if phase == ARMED else b"Disarmed"
+        # The switch off (level 1) hands arm control over to the page
+        if self.counting():
+            self.instructions = b""
+        elif phase == ARMED and self.switch:
+            self.instructions = b"Use the buttons below"
+        elif phase == ARMING:
+            self.instructions = b"Hold the button" if self.keys_held() else b"Arming in progress..."
+        elif self.switch:
+            self.instructions = b"Turn the switch"
+        elif self.button:
+            self.instructions = b"Hold the button"
+        else:
+            self.instructions = b"Turn switch off and remove keys"
+        self.controls = phase == ARMED and bool(self.switch)
+        self.reset_shown = self.flat_tone and not self.counting()
+        self.arming_shown = phase == ARMING
+        self.etag = b'"%x-%d"' % (BOOT_ID, self.version)
+        self.views_version = self.version
+
+    def status_text(self):
+        self.views()
+        return self.status
+
+    def button_instructions(self):
+        self.views()
+        return self.instructions
+
+    def show_controls(self):
+        self.views()
+        return self.controls
+
+    def show_reset(self):
+        self.views()
+        return self.reset_shown
+
+    def show_arming(self):
+        self.views()
+        return self.arming_shown
+
+    def state_etag(self):
+        """An ETag for the page state."""
+        self.views()
+        return self.etag
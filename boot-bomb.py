@@ -1,5 +1,6 @@
 gen = 1
 if gen:
     import bomb_new
+    bomb_new.run()
 else:
     import bomb
@@ -2,6 +2,8 @@ import network, espnow, _thread
 from machine import I2C, Pin
 from time import sleep_ms
 from lcd_I2C import I2cLcd
+from lcd_frame import LcdFrame
+import lcd_proto
 from pins import SC, SD
 import binascii
 
@@ -12,6 +14,7 @@ try:
     lcd.putstr("System Online")
     lcd.move_to(len("System Online") if len("System Online") < 16 else 15, 0)
     lcd.blink_cursor_on()
+    frame = LcdFrame(lcd)
     lcd_available = True
 except Exception as e:
     print("LCD not available: ", e)
@@ -26,37 +29,54 @@ print("Device MAC:", binascii.hexlify(mac, ':').decode())
 e = espnow.ESPNow()
 e.active(True)
 
-# Shared queue and lock
-lcd_queue = []
-lcd_mem = ["", ""]
-lcd_lock = _thread.allocate_lock()
+class Mailbox:
+    """Latest-value mailbox holding the newest text for each LCD line.
 
-def pad16(text):
-    return (text[:16] + " " * 16)[:16]
+    There is exactly one poster (on_recv_thread) and one reader (lcd_worker).
+    Lines are stored by plain reference assignment, which is atomic, so no
+    data lock is needed; `ready` is only used as a binary semaphore to wake
+    the reader. It is held while there is nothing new to show.
+    """
+
+    def __init__(self):
+        self.lines = ["", ""]
+        self.ready = _thread.allocate_lock()
+        self.ready.acquire()
+
+    def post(self, line1, line2):
+        """Stores new text for the lines that are not None and wakes the
+        reader. Unread text is overwritten.
+        """
+        if line1 is not None:
+            self.lines[0] = line1
+        if line2 is not None:
+            self.lines[1] = line2
+        if self.ready.locked():
+            self.ready.release()
+
+    def take(self):
+        """Blocks until something was posted, then returns both lines.
+
+        A post racing with take() may be returned half applied, but it always
+        leaves the mailbox ready again, so the next take() sees all of it.
+        """
+        self.ready.acquire()
+        return self.lines[0], self.lines[1]
+
+lcd_mailbox = Mailbox()
 
 def lcd_worker():
-    """Worker thread that updates the LCD from queue messages."""
-    global lcd_mem
+    """Worker thread that updates the LCD from the mailbox."""
+    cursor_blinking = True
     while True:
-        msg = None
-        with lcd_lock:
-            if lcd_queue:
-                msg = lcd_queue.pop(0)
-        if msg and lcd_available:
+        line1, line2 = lcd_mailbox.take()
+        if lcd_available:
             try:
-                line1, line2 = msg
                 print("Got request!")
                 print(line1)
                 print(line2)
-                if line1 == "NOCHANGE":
-                    line1 = lcd_mem[0]
-                if line2 == "NOCHANGE":
-                    line2 = lcd_mem[1]
-                lcd.move_to(0, 0)
-                lcd.putstr(pad16(line1[:16] if line1 else ""))
-                lcd.move_to(0, 1)
-                lcd.putstr(pad16(line2[:16] if line2 else ""))
-                lcd_mem = [line1, line2]
+                frame.draw(0, line1)
+                frame.draw(1, line2)
                 if len(line2.strip()) > 0:
                     x = min(len(line2), 15)
                     lcd.move_to(x, 1)
@@ -67,37 +87,38 @@ def lcd_worker():
                         lcd.move_to(0, 1)
                 else:
                     lcd.move_to(0, 0)
-                if len(line2) == 16:
-                    lcd.hide_cursor()
-                else:
-                    lcd.blink_cursor_on()
+                blink = len(line2) != 16
+                if blink != cursor_blinking:
+                    if blink:
+                        lcd.blink_cursor_on()
+                    else:
+                        lcd.hide_cursor()
+                    cursor_blinking = blink
             except Exception as ex:
                 print("LCD error:", ex)
-        sleep_ms(50)
 
 def on_recv_thread():
-    """Thread to listen for incoming ESP-NOW messages and enqueue them."""
-    global lcd_queue
+    """Thread to listen for incoming ESP-NOW messages and post them."""
     while True:
-        host, raw = e.recv()
+        # irecv() reuses its buffers instead of allocating per message.
+        host, raw = e.irecv()
         if raw:
             try:
-                # Messages are expected as b'line1|line2'
-                text = raw.decode().split("|", 1)
-                if len(text) == 2:
-                    line1, line2 = text
-                else:
-                    line1, line2 = text[0], ""
-                with lcd_lock:
-                    lcd_queue = []
-                    lcd_queue.append((line1, line2))
+                lines = lcd_proto.decode_lines(raw)
+                if lines is None:
+                    print("Unknown frame:", raw[:2])
+                    continue
+                lcd_mailbox.post(lines[0], lines[1])
             except Exception as ex:
                 print("Decode error:", ex)
 
-# Start threads
-_thread.start_new_thread(lcd_worker, ())
-_thread.start_new_thread(on_recv_thread, ())
+def start():
+    """Starts the LCD threads and returns; importing only sets things up."""
+    _thread.start_new_thread(lcd_worker, ())
+    _thread.start_new_thread(on_recv_thread, ())
+    print("LCD worker ready, waiting for ESP-NOW messages...")
 
-print("LCD worker ready, waiting for ESP-NOW messages...")
-while True:
-    sleep_ms(1000)
+if __name__ == "__main__":
+    start()
+    while True:
+        sleep_ms(1000)
@@ -0,0 +1,13 @@
+# Run on the host before uploading: writes a gzip copy of every page next to
+# it, which bomb_new serves instead of the plain file.
+import gzip
+
+PAGES = ["control.html", "disarm.html"]
+
+for name in PAGES:
+    with open(name, "rb") as f:
+        data = f.read()
+    packed = gzip.compress(data, 9, mtime=0)
+    with open(name + ".gz", "wb") as f:
+        f.write(packed)
+    print(f"{name}: {len(data)} -> {len(packed)} bytes")
@@ -0,0 +1,38 @@
+import time
+
+
+class DebouncedPin:
+    """Edge-triggered input with software debounce.
+
+    The pin IRQ only timestamps the first edge of a burst and sets `flag`.
+    Once the contacts have had time to stop bouncing, a task calls settle()
+    to commit the new level, dated from that first edge, so hold times can
+    be measured from the moment the contact actually changed.
+    """
+
+    def __init__(self, pin, flag):
+        self.pin = pin
+        self.flag = flag
+        self.state = pin.value()
+        self.since = time.ticks_ms()
+        self.edge = self.since
+        self.pending = False
+        pin.irq(self.irq, pin.IRQ_FALLING | pin.IRQ_RISING)
+
+    def irq(self, pin):
+        if not self.pending:
+            self.edge = time.ticks_ms()
+            self.pending = True
+            self.flag.set()
+
+    def settle(self):
+        """Commits the pin's current level. Returns True if it changed."""
+        pending = self.pending
+        self.pending = False
+        state = self.pin.value()
+        if state == self.state:
+            return False
+        self.state = state
+        # A change without an IRQ (e.g. the edge was lost) is dated now
+        self.since = self.edge if pending else time.ticks_ms()
+        return True
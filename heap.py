@@ -0,0 +1,55 @@
+# Garbage collection at points of our choosing.
+#
+# The countdown, the disarm ticker and the HTTP server all allocate, and an
+# automatic collection stalls whichever of them happened to run out of room,
+# beep or not. Once setup() has run, the tasks call collect_within() where
+# they have time to spare; every pause is timed, so the time one needs is
+# known, and the automatic threshold is only a backstop.
+import gc
+import time
+
+# Garbage worth collecting; with less a safe point does nothing
+MIN_GARBAGE = 4096
+# Headroom on top of the longest pause seen when checking that one fits
+MARGIN_US = 1000
+# The backstop collects after this fraction of the free heap is allocated
+THRESHOLD_DIVISOR = 4
+
+enabled = False
+baseline = 0  # mem_alloc() just after the last collection
+collections = 0
+last_pause_us = 0
+max_pause_us = 0
+
+
+def setup():
+    """Collects now, which also times a first pause, and switches the safe
+    points on.
+    """
+    global enabled
+    collect()
+    gc.threshold(gc.mem_free() // THRESHOLD_DIVISOR)
+    enabled = True
+
+
+def collect():
+    global baseline, collections, last_pause_us, max_pause_us
+    start = time.ticks_us()
+    gc.collect()
+    last_pause_us = time.ticks_diff(time.ticks_us(), start)
+    max_pause_us = max(max_pause_us, last_pause_us)
+    collections += 1
+    baseline = gc.mem_alloc()
+
+
+def collect_within(budget_ms=None):
+    """A safe point: collects if enough garbage has built up and the longest
+    pause so far fits in `budget_ms` (None for no limit). Returns True if it
+    collected.
+    """
+    if not enabled or gc.mem_alloc() - baseline < MIN_GARBAGE:
+        return False
+    if budget_ms is not None and budget_ms * 1000 < max_pause_us + MARGIN_US:
+        return False
+    collect()
+    return True
@@ -0,0 +1,120 @@
+# Event journal: fixed-size binary records kept in a RAM ring and appended
+# to a file on flash in batches, so logging costs a pack_into() and can
+# stay on during play.
+#
+# Record layout, little endian, RECORD_SIZE bytes:
+#   u32 ticks_ms   when it happened
+#   u8  code       what happened, one of the EV_* codes
+#   u8  a          payload; what a and b mean depends on the code
+#   u16 b
+import os
+import struct
+import time
+
+RECORD = "<IBBH"
+RECORD_SIZE = 8
+FORMAT = 1
+# The file is moved to <path>.old once it grows past this
+MAX_FILE_BYTES = 32 * 1024
+
+EV_BOOT = 1      # b: FORMAT
+EV_PHASE = 2     # a: new phase (bomb_state), b: disarm hold left, 1/100 s
+EV_INPUT = 3     # a: switch level << 1 | button level
+EV_TICK = 4      # a: ms late (max 255), b: countdown ms left
+EV_COMMAND = 5   # a: index into COMMANDS, b: HTTP status
+
+EVENT_NAMES = {EV_BOOT: "BOOT", EV_PHASE: "PHASE", EV_INPUT: "INPUT", EV_TICK: "TICK", EV_COMMAND: "COMMAND"}
+
+# Web commands, by the index EV_COMMAND records them with
+COMMANDS = (b"/hold_start", b"/hold_stop", b"/reset", b"/activate", b"/disarm")
+
+
+class Journal:
+    def __init__(self, records, path=None):
+        self.capacity = records
+        self.buf = bytearray(records * RECORD_SIZE)
+        self.view = memoryview(self.buf)
+        self.path = path
+        # Counts of records logged and written to flash since boot
+        self.logged = 0
+        self.flushed = 0
+        self.dropped = 0
+        # Downloads under way; the file must not change under them
+        self.reading = 0
+
+    def log(self, code, a=0, b=0):
+        offset = (self.logged % self.capacity) * RECORD_SIZE
+        struct.pack_into(RECORD, self.buf, offset, time.ticks_ms(), code, a & 0xff, min(max(b, 0), 0xffff))
+        self.logged += 1
+        if self.logged - self.flushed > self.capacity:
+            # Overwrote the oldest record that had not reached flash
+            self.flushed += 1
+            self.dropped += 1
+
+    def pending(self):
+        """The records not on flash yet, oldest first, as up to two views."""
+        count = self.logged - self.flushed
+        if not count:
+            return ()
+        start = (self.flushed % self.capacity) * RECORD_SIZE
+        end = (self.logged % self.capacity) * RECORD_SIZE
+        if start < end:
+            return (self.view[start:end],)
+        return (self.view[start:], self.view[:end])
+
+    def flush(self):
+        """Appends the pending records to the file. Returns how many were
+        written. Flash writes stall the CPU, so call it when that is safe.
+        """
+        if self.path is None or self.logged == self.flushed or self.reading:
+            return 0
+        try:
+            if os.stat(self.path)[6] >= MAX_FILE_BYTES:
+                try:
+                    os.remove(self.path + ".old")
+                except OSError:
+                    pass
+                os.rename(self.path, self.path + ".old")
+        except OSError:
+            pass
+        count = self.logged - self.flushed
+        with open(self.path, "ab") as f:
+            for part in self.pending():
+                f.write(part)
+        self.flushed = self.logged
+        return count
+
+    def read(self, buf):
+        """Yields the journal file, read into `buf` a chunk at a time, and
+        then the pending records. Each view is only good until the next
+        one is asked for. Flushes wait until the generator is done or
+        closed, so no record is sent twice or missed.
+        """
+        view = memoryview(buf)
+        self.reading += 1
+        try:
+            try:
+                f = open(self.path, "rb") if self.path is not None else None
+            except OSError:
+                f = None
+            if f is not None:
+                with f:
+                    while True:
+                        n = f.readinto(buf)
+                        if not n:
+                            break
+                        yield view[:n]
+            for part in self.pending():
+                yield part
+        finally:
+            self.reading -= 1
+
+    def snapshot(self):
+        """The whole journal as bytes, for the host tools."""
+        return b"".join(bytes(part) for part in self.read(bytearray(512)))
+
+
+def decode(data):
+    """Yields (ticks_ms, code, a, b) for every whole record in `data`."""
+    for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+        yield struct.unpack_from(RECORD, data, offset)
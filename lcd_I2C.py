@@ -10,6 +10,10 @@ MASK_E = 0x04
 SHIFT_BACKLIGHT = 3
 SHIFT_DATA = 4
 
+# Longest run of data bytes shipped in a single I2C transaction; one DDRAM
+# line on the largest supported controller.
+MAX_BATCH = 40
+
 
 class I2cLcd(LcdApi):
     """Implements a HD44780 character LCD connected via PCF8574 on I2C."""
@@ -17,6 +21,12 @@ class I2cLcd(LcdApi):
     def __init__(self, i2c, i2c_addr, num_lines, num_columns):
         self.i2c = i2c
         self.i2c_addr = i2c_addr
+        # Each LCD byte is two nibbles, each clocked with E high then E low,
+        # so every byte costs four PCF8574 writes. They are packed into
+        # these buffers and sent as one transaction.
+        self.byte_buf = bytearray(4)
+        self.batch_buf = bytearray(4 * MAX_BATCH)
+        self.batch_view = memoryview(self.batch_buf)
         self.i2c.writeto(self.i2c_addr, bytearray([0]))
         sleep_ms(20)
         self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
@@ -39,8 +49,7 @@ class I2cLcd(LcdApi):
         This particular function is only used during initialization.
         """
         byte = ((nibble >> 4) & 0x0f) << SHIFT_DATA
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E, byte]))
 
     def hal_backlight_on(self):
         """Allows the hal layer to turn the backlight on."""
@@ -50,25 +59,46 @@ class I2cLcd(LcdApi):
         """Allows the hal layer to turn the backlight off."""
         self.i2c.writeto(self.i2c_addr, bytearray([0]))
 
+    def pack_byte(self, buf, offset, byte, rs):
+        """Packs the four PCF8574 writes that clock `byte` into the LCD
+        (high nibble then low nibble, each latched on the falling edge of E)
+        into `buf` starting at `offset`.
+        """
+        flags = rs | (self.backlight << SHIFT_BACKLIGHT)
+        high = flags | (((byte >> 4) & 0x0f) << SHIFT_DATA)
+        low = flags | ((byte & 0x0f) << SHIFT_DATA)
+        buf[offset] = high | MASK_E
+        buf[offset + 1] = high
+        buf[offset + 2] = low | MASK_E
+        buf[offset + 3] = low
+
     def hal_write_command(self, cmd):
         """Writes a command to the LCD.
 
         Data is latched on the falling edge of E.
         """
-        byte = ((self.backlight << SHIFT_BACKLIGHT) | (((cmd >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
-        byte = ((self.backlight << SHIFT_BACKLIGHT) | ((cmd & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.pack_byte(self.byte_buf, 0, cmd, 0)
+        self.i2c.writeto(self.i2c_addr, self.byte_buf)
         if cmd <= 3:
             sleep_ms(5)
 
     def hal_write_data(self, data):
         """Write data to the LCD."""
-        byte = (MASK_RS | (self.backlight << SHIFT_BACKLIGHT) | (((data >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
-        byte = (MASK_RS | (self.backlight << SHIFT_BACKLIGHT) | ((data & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.pack_byte(self.byte_buf, 0, data, MASK_RS)
+        self.i2c.writeto(self.i2c_addr, self.byte_buf)
+
+    def hal_write_str(self, string):
+        """Write the characters of a string to the LCD as data.
+
+        Up to MAX_BATCH characters go out in a single I2C transaction.
+        """
+        buf = self.batch_buf
+        count = 0
+        for char in string:
+            self.pack_byte(buf, count << 2, ord(char), MASK_RS)
+            count += 1
+            if count == MAX_BATCH:
+                self.i2c.writeto(self.i2c_addr, buf)
+                count = 0
+        if count:
+            self.i2c.writeto(self.i2c_addr, self.batch_view[:count << 2])
@@ -137,20 +137,48 @@ class LcdApi:
         else:
             self.hal_write_data(ord(char))
             self.cursor_x += 1
-        if self.cursor_x >= self.num_columns:
-            self.cursor_x = 0
-            self.cursor_y += 1
-            self.implied_newline = (char != '\n')
-        if self.cursor_y >= self.num_lines:
-            self.cursor_y = 0
-        self.move_to(self.cursor_x, self.cursor_y)
+        self.wrap_cursor(char != '\n')
 
     def putstr(self, string):
         """Write the indicated string to the LCD at the current cursor
         position and advances the cursor position appropriately.
+
+        The controller runs in LCD_ENTRY_INC mode and advances its own
+        address after every character, so runs that fit on the current line
+        are streamed as data and an address command is only sent on wraps.
         """
-        for char in string:
-            self.putchar(char)
+        i = 0
+        n = len(string)
+        while i < n:
+            space = self.num_columns - self.cursor_x
+            if string[i] == '\n' or space <= 0:
+                self.putchar(string[i])
+                i += 1
+                continue
+            j = i + 1
+            while j < n and j - i < space and string[j] != '\n':
+                j += 1
+            self.hal_write_str(string[i:j])
+            self.cursor_x += j - i
+            self.wrap_cursor(True)
+            i = j
+
+    def wrap_cursor(self, implied):
+        """Moves the cursor to the start of the next line once it has run
+        off the end of the current one. `implied` is False when the wrap
+        was requested by an explicit newline.
+        """
+        wrapped = False
+        if self.cursor_x >= self.num_columns:
+            self.cursor_x = 0
+            self.cursor_y += 1
+            self.implied_newline = implied
+            wrapped = True
+        if self.cursor_y >= self.num_lines:
+            self.cursor_y = 0
+            wrapped = True
+        if wrapped:
+            self.move_to(self.cursor_x, self.cursor_y)
 
     def custom_char(self, location, charmap):
         """Write a character to one of the 8 CGRAM locations, available
@@ -194,6 +222,15 @@ class LcdApi:
         """
         raise NotImplementedError
 
+    def hal_write_str(self, string):
+        """Write the characters of a string to the LCD as data.
+
+        A derived HAL class may override this to send the whole run in one
+        bus transaction; by default each character is written separately.
+        """
+        for char in string:
+            self.hal_write_data(ord(char))
+
     def hal_sleep_us(self, usecs):
         """Sleep for some time (given in microseconds)."""
         time.sleep_us(usecs)
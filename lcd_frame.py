@@ -0,0 +1,55 @@
+class LcdFrame:
+    """Shadow copy of what is currently shown on an LcdApi display.
+
+    Lines written through draw() are compared against the shadow and only
+    the runs of cells that actually changed are sent to the LCD.
+    """
+
+    def __init__(self, lcd):
+        self.lcd = lcd
+        # None means the line's contents are unknown and must be redrawn.
+        self.lines = [None] * lcd.num_lines
+
+    def invalidate(self):
+        """Forgets the shadow, so the next draw() rewrites every cell.
+
+        Call this after anything writes to the LCD behind the frame's back.
+        """
+        for y in range(len(self.lines)):
+            self.lines[y] = None
+
+    def draw(self, y, text):
+        """Shows `text`, padded or cut to the display width, on line `y`."""
+        cols = self.lcd.num_columns
+        text = (text[:cols] + " " * cols)[:cols]
+        old = self.lines[y]
+        if old is None:
+            self.write_run(y, text, 0, cols)
+        elif old != text:
+            x = 0
+            while x < cols:
+                if text[x] == old[x]:
+                    x += 1
+                    continue
+                start = x
+                x += 1
+                end = x
+                while x < cols:
+                    if text[x] != old[x]:
+                        x += 1
+                        end = x
+                    elif x + 1 < cols and text[x + 1] != old[x + 1]:
+                        # Rewriting one unchanged cell costs the same as the
+                        # address command needed to skip over it.
+                        x += 1
+                    else:
+                        break
+                self.write_run(y, text, start, end)
+        self.lines[y] = text
+
+    def write_run(self, y, text, start, end):
+        """Writes text[start:end] at column `start` of line `y`."""
+        lcd = self.lcd
+        if lcd.cursor_x != start or lcd.cursor_y != y:
+            lcd.move_to(start, y)
+        lcd.putstr(text[start:end])
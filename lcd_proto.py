@@ -0,0 +1,75 @@
+# ESP-NOW display protocol shared by the bomb and the LCD board.
+#
+# Frame layout:
+#   byte 0      VERSION << 4 | opcode
+#   byte 1      line mask, LINE1 / LINE2 set for every line carried
+#   then WIDTH bytes per carried line, in line order, padded with NULs
+# A line whose bit is clear is left unchanged on the display.
+
+VERSION = 1
+
+OP_LINES = 0x1
+
+LINE1 = 0x01
+LINE2 = 0x02
+
+WIDTH = 16
+HEADER_SIZE = 2
+FRAME_SIZE = HEADER_SIZE + 2 * WIDTH
+
+
+def put_line(buf, offset, line):
+    """Writes `line` as a WIDTH byte NUL padded field at `offset`."""
+    n = min(len(line), WIDTH)
+    for i in range(n):
+        buf[offset + i] = ord(line[i]) & 0xff
+    for i in range(n, WIDTH):
+        buf[offset + i] = 0
+
+
+def get_line(frame, offset):
+    """Reads back a field written by put_line()."""
+    end = offset
+    while end < offset + WIDTH and frame[end]:
+        end += 1
+    return bytes(frame[offset:end]).decode()
+
+
+def encode_lines(buf, line1, line2):
+    """Packs a display frame into `buf` (at least FRAME_SIZE bytes) and
+    returns its length. A line given as None is marked unchanged.
+    """
+    buf[0] = (VERSION << 4) | OP_LINES
+    mask = 0
+    offset = HEADER_SIZE
+    if line1 is not None:
+        put_line(buf, offset, line1)
+        mask |= LINE1
+        offset += WIDTH
+    if line2 is not None:
+        put_line(buf, offset, line2)
+        mask |= LINE2
+        offset += WIDTH
+    buf[1] = mask
+    return offset
+
+
+def decode_lines(frame):
+    """Unpacks a display frame into (line1, line2), with None for lines
+    that are unchanged. Returns None if the frame is not understood.
+    """
+    if len(frame) < HEADER_SIZE or frame[0] != (VERSION << 4) | OP_LINES:
+        return None
+    mask = frame[1]
+    offset = HEADER_SIZE
+    line1 = line2 = None
+    if mask & LINE1:
+        if len(frame) < offset + WIDTH:
+            return None
+        line1 = get_line(frame, offset)
+        offset += WIDTH
+    if mask & LINE2:
+        if len(frame) < offset + WIDTH:
+            return None
+        line2 = get_line(frame, offset)
+    return line1, line2
@@ -0,0 +1,121 @@
+# Latency histograms for the hot paths, to find what holds up the beeps.
+#
+# A Histogram counts durations in microseconds into fixed buckets, so adding
+# one is a few comparisons and no allocation, and min, max and quantiles can
+# be read off at any time. Loops time a stretch of their own body with
+# start() and stop(); whole functions are wrapped with timed(). With ENABLED
+# set to False, timed() hands functions back untouched and start(), stop()
+# and record() return at once.
+import time
+
+ENABLED = True
+
+# Upper bounds of the buckets, in us; longer durations land in a last,
+# open-ended one
+BOUNDS = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+histograms = []
+
+
+class Histogram:
+    __slots__ = ("name", "description", "counts", "count", "total", "min", "max")
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def add(self, us):
+        i = 0
+        for bound in BOUNDS:
+            if us <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        if not self.count or us < self.min:
+            self.min = us
+        if us > self.max:
+            self.max = us
+        self.count += 1
+        self.total += us
+
+    def quantile(self, q):
+        """An upper bound on the `q` quantile: the top of the bucket it
+        falls in, or the largest duration seen if that is less.
+        """
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i in range(len(BOUNDS)):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(BOUNDS[i], self.max)
+        return self.max
+
+
+def histogram(name, description):
+    """Makes a histogram that render() reports."""
+    h = Histogram(name, description)
+    histograms.append(h)
+    return h
+
+
+def start():
+    return time.ticks_us() if ENABLED else 0
+
+
+def stop(h, started):
+    """Adds the time since `started`, from start(), to `h`."""
+    if ENABLED:
+        h.add(time.ticks_diff(time.ticks_us(), started))
+
+
+def record(h, us):
+    """Adds a duration measured some other way to `h`."""
+    if ENABLED:
+        h.add(us)
+
+
+def timed(h):
+    """Decorates a function so that every call is added to `h`."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+
+        def timed_fn(*args):
+            started = time.ticks_us()
+            try:
+                return fn(*args)
+            finally:
+                h.add(time.ticks_diff(time.ticks_us(), started))
+        return timed_fn
+    return wrap
+
+
+def render():
+    """All histograms in the Prometheus text format, as summaries with the
+    min (quantile 0), median, p99 and max (quantile 1).
+    """
+    lines = []
+    for h in histograms:
+        name = h.name.encode()
+        lines.append(b"# HELP %s %s" % (name, h.description.encode()))
+        lines.append(b"# TYPE %s summary" % name)
+        lines.append(b'%s{quantile="0"} %d' % (name, h.min))
+        lines.append(b'%s{quantile="0.5"} %d' % (name, h.quantile(0.5)))
+        lines.append(b'%s{quantile="0.99"} %d' % (name, h.quantile(0.99)))
+        lines.append(b'%s{quantile="1"} %d' % (name, h.max))
+        lines.append(b"%s_sum %d" % (name, h.total))
+        lines.append(b"%s_count %d" % (name, h.count))
+    lines.append(b"")
+    return b"\n".join(lines)
@@ -0,0 +1,75 @@
+import asyncio
+
+
+def pattern_ms(pattern):
+    """Total length of a pattern in ms, not counting held steps."""
+    return sum(step[2] for step in pattern if step[2] is not None)
+
+
+class PatternPlayer:
+    """Plays buzzer/LED patterns in the background on the asyncio loop.
+
+    A pattern is a sequence of (freq, duty, duration_ms, led) steps; a step
+    with a duration of None is held until something else is played or
+    stop() is called. A new pattern preempts the one playing unless that
+    one has a higher priority.
+    """
+
+    def __init__(self, pwm, led):
+        self.pwm = pwm
+        self.led = led
+        self.pattern = None
+        self.priority = 0
+        # Bumped by play() and stop(), so the player can tell whether the
+        # pattern it is running is still the current one.
+        self.generation = 0
+        self.wake = asyncio.Event()
+
+    def play(self, pattern, priority=0):
+        """Starts playing `pattern`. Returns False, leaving the current
+        pattern alone, if a higher priority one is playing.
+        """
+        if self.pattern is not None and priority < self.priority:
+            return False
+        self.pattern = pattern
+        self.priority = priority
+        self.generation += 1
+        self.wake.set()
+        return True
+
+    def stop(self):
+        """Silences the player, whatever is playing."""
+        self.pattern = None
+        self.priority = 0
+        self.generation += 1
+        self.wake.set()
+
+    def output(self, freq, duty, led):
+        if duty:
+            self.pwm.freq(freq)
+        self.pwm.duty_u16(duty)
+        self.led.value(led)
+
+    async def run(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            pattern = self.pattern
+            generation = self.generation
+            if pattern is None:
+                self.output(0, 0, 0)
+                continue
+            for freq, duty, duration, led in pattern:
+                self.output(freq, duty, led)
+                if duration is None:
+                    break
+                try:
+                    await asyncio.wait_for_ms(self.wake.wait(), duration)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                if self.generation == generation:
+                    self.pattern = None
+                    self.priority = 0
+                    self.output(0, 0, 0)
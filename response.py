@@ -0,0 +1,296 @@
+# Request/response buffers for the HTTP server that are allocated once per
+# connection and reused for every request on it, so steady-state polling
+# does not churn the heap.
+
+HEAD_SIZE = 256
+# Largest request head (and pipelined requests after it) a Request holds
+REQUEST_SIZE = 1024
+
+
+def put(buf, n, data):
+    """Copies `data` into `buf` at `n` and returns the new end."""
+    end = n + len(data)
+    buf[n:end] = data
+    return end
+
+
+def put_int(buf, n, value):
+    """Writes `value` in decimal into `buf` at `n`; returns the new end."""
+    if value < 0:
+        buf[n] = 45  # -
+        n += 1
+        value = -value
+    start = n
+    while True:
+        buf[n] = 48 + value % 10
+        n += 1
+        value //= 10
+        if not value:
+            break
+    # Digits came out least significant first
+    i = start
+    j = n - 1
+    while i < j:
+        buf[i], buf[j] = buf[j], buf[i]
+        i += 1
+        j -= 1
+    return n
+
+
+def same(buf, start, end, text):
+    """Whether buf[start:end] is `text`, compared in place."""
+    if end - start != len(text):
+        return False
+    for i in range(len(text)):
+        if buf[start + i] != text[i]:
+            return False
+    return True
+
+
+def same_folded(buf, start, end, text):
+    """Like same(), ignoring case; `text` is in lower case."""
+    if end - start != len(text):
+        return False
+    for i in range(len(text)):
+        if buf[start + i] | 0x20 != text[i]:
+            return False
+    return True
+
+
+def contains_folded(buf, start, end, text):
+    """Whether `text`, in lower case, occurs in buf[start:end], ignoring case."""
+    for i in range(start, end - len(text) + 1):
+        if same_folded(buf, i, i + len(text), text):
+            return True
+    return False
+
+
+class Request:
+    """A request head, read into a buffer allocated once and parsed in
+    place, so reading a request allocates nothing.
+
+    The connection reads into `buf` after the `n` bytes already there,
+    calling scan() after each read until it returns True. Fields that hold
+    bytes from the head are kept as spans of `buf`; `path` is set by
+    match() to one of the caller's known paths.
+    """
+
+    def __init__(self, size=REQUEST_SIZE):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.n = 0
+        self.end = 0
+        self.next()
+
+    def begin(self, byte):
+        """Starts the buffer afresh with the first byte of a request, read
+        before the connection had this Request.
+        """
+        self.buf[0] = byte
+        self.n = 1
+        self.end = 0
+
+    def pending(self):
+        """Whether bytes of a pipelined request are waiting in the buffer."""
+        return self.n > self.end
+
+    def next(self):
+        """Drops the last head (and body), keeping any pipelined bytes
+        after it, and gets ready for the next one.
+        """
+        rest = self.n - self.end
+        if rest > 0 and self.end:
+            self.view[:rest] = self.view[self.end:self.n]
+        self.n = max(rest, 0)
+        self.end = 0
+        self.scanned = 0
+        self.line_start = 0
+        self.get = False
+        self.path = None
+        self.path_start = self.path_end = 0
+        self.http10 = False
+        self.close = False
+        self.keep_alive_asked = False
+        self.content_length = 0
+        self.etag_start = self.etag_end = 0
+        self.gzip = False
+
+    def full(self):
+        return self.n == len(self.buf)
+
+    def scan(self):
+        """Parses the lines that have arrived. Returns True once the blank
+        line ending the head is in; `end` is then just past it.
+        """
+        buf = self.buf
+        i = self.scanned
+        while i < self.n:
+            if buf[i] == 10:  # \n
+                start = self.line_start
+                end = i - 1 if i > start and buf[i - 1] == 13 else i  # \r
+                self.line_start = i + 1
+                if end > start:
+                    if self.path_end:
+                        self.header(start, end)
+                    else:
+                        self.request_line(start, end)
+                elif self.path_end:
+                    self.end = self.scanned = i + 1
+                    return True
+                # Blank lines before the request line are skipped
+            i += 1
+        self.scanned = i
+        return False
+
+    def request_line(self, start, end):
+        buf = self.buf
+        first = start
+        while first < end and buf[first] != 32:
+            first += 1
+        second = first + 1
+        while second < end and buf[second] != 32:
+            second += 1
+        if second >= end:
+            raise ValueError("bad request line")
+        self.get = same(buf, start, first, b"GET")
+        self.path_start = path_end = first + 1
+        while path_end < second and buf[path_end] != 63:  # ?
+            path_end += 1
+        self.path_end = path_end
+        self.http10 = same(buf, second + 1, end, b"HTTP/1.0")
+
+    def header(self, start, end):
+        buf = self.buf
+        # Only a few headers matter; their first letters rule out the rest
+        initial = buf[start] | 0x20
+        if initial != 99 and initial != 105 and initial != 97:  # c, i, a
+            return
+        colon = start
+        while colon < end and buf[colon] != 58:  # :
+            colon += 1
+        value = colon + 1
+        while value < end and buf[value] == 32:
+            value += 1
+        while end > value and buf[end - 1] == 32:
+            end -= 1
+        if same_folded(buf, start, colon, b"connection"):
+            self.close = same_folded(buf, value, end, b"close")
+            self.keep_alive_asked = same_folded(buf, value, end, b"keep-alive")
+        elif same_folded(buf, start, colon, b"content-length"):
+            length = 0
+            for i in range(value, end):
+                digit = buf[i] - 48
+                if not 0 <= digit <= 9:
+                    raise ValueError("bad content length")
+                length = length * 10 + digit
+            self.content_length = length
+        elif same_folded(buf, start, colon, b"if-none-match"):
+            self.etag_start = value
+            self.etag_end = end
+        elif same_folded(buf, start, colon, b"accept-encoding"):
+            self.gzip = contains_folded(buf, value, end, b"gzip")
+
+    def match(self, paths):
+        """Sets `path` to the entry of `paths` equal to the request path,
+        or None if there is none.
+        """
+        for path in paths:
+            if same(self.buf, self.path_start, self.path_end, path):
+                self.path = path
+                return
+        self.path = None
+
+    def skip_body(self):
+        """Drops the body bytes already in the buffer; returns how many
+        are still to come.
+        """
+        here = min(self.content_length, self.n - self.end)
+        self.end += here
+        return self.content_length - here
+
+    def etag_matches(self, etag):
+        """Whether If-None-Match named exactly `etag`."""
+        return same(self.buf, self.etag_start, self.etag_end, etag)
+
+    def keep_alive(self):
+        """Whether the client wants the connection kept open afterwards."""
+        if self.http10:
+            return self.keep_alive_asked
+        return not self.close
+
+
+class Response:
+    """A response built in preallocated buffers.
+
+    A route calls start() and then adds the body, or points `data` at an
+    existing bytes object for large static bodies, or sets `chunks` to an
+    iterator of buffers for a body too large to hold at once; that one is
+    sent without a length and ends when the connection closes. finish()
+    assembles the status line, headers and body in the output buffer.
+    """
+
+    def __init__(self, size):
+        self.body = bytearray(size)
+        self.body_view = memoryview(self.body)
+        self.out = bytearray(HEAD_SIZE + size)
+        self.out_view = memoryview(self.out)
+        self.start(b"", b"")
+
+    def start(self, status, content_type, headers=b"", etag=None):
+        """Begins a response. `headers` holds extra header lines."""
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers
+        self.etag = etag
+        self.n = 0
+        self.data = None
+        self.chunks = None
+
+    def add(self, data):
+        self.n = put(self.body, self.n, data)
+
+    def add_int(self, value):
+        self.n = put_int(self.body, self.n, value)
+
+    def add_fixed(self, value, places):
+        """Adds `value`, an integer count of 10**-places units, as a
+        decimal with `places` digits after the point.
+        """
+        if value < 0:
+            self.add(b"-")
+            value = -value
+        scale = 10 ** places
+        self.add_int(value // scale)
+        self.add(b".")
+        frac = value % scale
+        while scale > 10:
+            scale //= 10
+            if frac < scale:
+                self.add(b"0")
+        self.add_int(frac)
+
+    def add_bool(self, value):
+        self.add(b"true" if value else b"false")
+
+    def finish(self, keep_alive, with_length=True):
+        """Returns a view of the complete response; a `data` body still has
+        to be sent after it.
+        """
+        out = self.out
+        n = put(out, 0, b"HTTP/1.1 ")
+        n = put(out, n, self.status)
+        n = put(out, n, b"\r\nContent-Type: ")
+        n = put(out, n, self.content_type)
+        if with_length:
+            n = put(out, n, b"\r\nContent-Length: ")
+            n = put_int(out, n, self.n if self.data is None else len(self.data))
+        n = put(out, n, b"\r\n")
+        if self.etag is not None:
+            n = put(out, n, b"ETag: ")
+            n = put(out, n, self.etag)
+            n = put(out, n, b"\r\n")
+        n = put(out, n, self.headers)
+        n = put(out, n, b"Connection: keep-alive\r\n\r\n" if keep_alive else b"Connection: close\r\n\r\n")
+        if self.data is None:
+            n = put(out, n, self.body_view[:self.n])
+        return self.out_view[:n]
@@ -0,0 +1,116 @@
+# Host-side simulation of the two boards.
+#
+# install() puts the stand-in machine, network, espnow and aioespnow modules
+# in sys.modules, ahead of anything real, and fills in the MicroPython-only
+# parts of time, asyncio and gc that the code uses, driven by the virtual
+# clock in sim.clock. Call it before importing any of the board code.
+import sys
+
+from sim import clock
+
+# Free heap reported by the gc shim on CPython
+HEAP_SIZE = 8 * 1024 * 1024
+
+installed = False
+
+
+def install():
+    global installed
+    if installed:
+        return
+    installed = True
+    from sim import machine, network, espnow, aioespnow
+    sys.modules["machine"] = machine
+    sys.modules["network"] = network
+    sys.modules["espnow"] = espnow
+    sys.modules["aioespnow"] = aioespnow
+    if sys.implementation.name == "micropython":
+        # asyncio reads the time module when it is first imported, so it
+        # runs on the virtual clock too
+        sys.modules["time"] = clock
+    else:
+        from sim import micropython
+        sys.modules["micropython"] = micropython
+        install_time()
+        install_asyncio()
+        install_gc()
+
+
+def install_time():
+    import time
+    for name in ("ticks_ms", "ticks_us", "ticks_add", "ticks_diff", "sleep_ms", "sleep_us"):
+        setattr(time, name, getattr(clock, name))
+
+
+def install_asyncio():
+    import asyncio
+
+    class SimLoop(asyncio.SelectorEventLoop):
+        def time(self):
+            return clock.monotonic_us() / 1000000
+
+    class SimPolicy(asyncio.DefaultEventLoopPolicy):
+        def new_event_loop(self):
+            loop = SimLoop()
+            # A jump of the clock has to wake a loop that is already asleep
+            clock.on_advance = lambda: loop.is_closed() or loop.call_soon_threadsafe(lambda: None)
+            return loop
+
+    class ThreadSafeFlag:
+        def __init__(self):
+            self.event = asyncio.Event()
+            self.loop = None
+
+        def set(self):
+            loop = self.loop
+            if loop is None or in_loop(loop):
+                self.event.set()
+            else:
+                loop.call_soon_threadsafe(self.event.set)
+
+        def clear(self):
+            self.event.clear()
+
+        async def wait(self):
+            self.loop = asyncio.get_running_loop()
+            await self.event.wait()
+            self.event.clear()
+
+    def in_loop(loop):
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+    def wait_for_ms(aw, ms):
+        return asyncio.wait_for(aw, ms / 1000)
+
+    # MicroPython's streams read straight into a buffer
+    async def readinto(self, buf):
+        data = await self.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    asyncio.set_event_loop_policy(SimPolicy())
+    asyncio.ThreadSafeFlag = ThreadSafeFlag
+    asyncio.sleep_ms = sleep_ms
+    asyncio.wait_for_ms = wait_for_ms
+    asyncio.StreamReader.readinto = readinto
+
+
+def install_gc():
+    import gc
+    import tracemalloc
+
+    def mem_alloc():
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    def mem_free():
+        return HEAP_SIZE - mem_alloc()
+
+    gc.mem_alloc = mem_alloc
+    gc.mem_free = mem_free
+    gc.threshold = lambda amount=None: -1 if amount is None else None
@@ -0,0 +1,17 @@
+# Stand-in for MicroPython's aioespnow module, on top of the loopback link.
+import asyncio
+from sim.espnow import ESPNow
+
+POLL_MS = 10
+
+
+class AIOESPNow(ESPNow):
+    async def asend(self, mac, msg, sync=True):
+        return self.send(mac, msg, sync)
+
+    async def airecv(self):
+        while not self.any():
+            await asyncio.sleep_ms(POLL_MS)
+        return self.irecv(0)
+
+    arecv = airecv
@@ -0,0 +1,321 @@
+# Load test for the bomb's web server. Runs on the host under CPython:
+#
+#   python -m sim.bench [--clients N] [--duration S] [--mode page|state|legacy]
+#                       [--countdown] [--host H] [--port P] [--json FILE]
+#
+# from the repo root. Unless --host is given, the server is the simulated
+# bomb (sim.run), started in a subprocess so the clients do not share its
+# CPU. Each client is a browser with one page open, making the requests
+# that page's JavaScript makes, over at most six keep-alive connections like
+# a phone browser:
+#   page    the current pages: load /, then follow /events, falling back to
+#           polling /state every 200 ms if the stream is refused
+#   state   only the /state polling fallback
+#   legacy  the original pages' polling: seven text routes every 200 ms
+#           (plus /armprogress while arming) and /statdisarm every 500 ms
+# Latencies are as the page sees them, including time queued in the
+# browser for a free connection.
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+MAX_CONNECTIONS_PER_HOST = 6
+REQUEST_TIMEOUT_S = 5
+STARTUP_TIMEOUT_S = 10
+
+LEGACY_STATUS_ROUTES = ["/status", "/delay", "/buttoninstructions", "/armedstatus",
+                        "/showreset", "/hidedelay", "/armingstatus"]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self.events = 0
+        self.refused_streams = 0
+
+    def record(self, path, status, ms):
+        self.latencies.setdefault(path, []).append(ms)
+        counts = self.statuses.setdefault(path, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def error(self, path):
+        self.errors[path] = self.errors.get(path, 0) + 1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Browser:
+    """A page's view of the server: a small keep-alive connection pool."""
+
+    def __init__(self, host, port, stats):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.idle = []
+        # Like the browser's cache, revalidate what came with an ETag
+        self.etags = {}
+        self.slots = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+        self.tasks = set()
+
+    async def get(self, path, headers=b""):
+        """Fetches `path`; returns (status, body), or None on a socket error."""
+        start = time.perf_counter()
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.open_connection(self.host, self.port)
+                reader, writer = conn
+                if path in self.etags:
+                    headers += b"If-None-Match: " + self.etags[path] + b"\r\n"
+                writer.write(b"GET " + path.encode() + b" HTTP/1.1\r\nHost: bomb\r\n" + headers + b"\r\n")
+                status, head, body = await asyncio.wait_for(read_response(reader), REQUEST_TIMEOUT_S)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                self.stats.error(path)
+                if conn is not None:
+                    conn[1].close()
+                return None
+            etag = header(head, b"etag")
+            if etag is not None:
+                self.etags[path] = etag
+            if b"connection: close" in head.lower():
+                writer.close()
+            else:
+                self.idle.append(conn)
+        self.stats.record(path, status, (time.perf_counter() - start) * 1000)
+        return status, body
+
+    def spawn(self, coro):
+        """Starts a fetch without waiting for it, like fetch() in a page."""
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def every(self, ms, tick, until):
+        """Calls `tick` every `ms` until `until`, like setInterval()."""
+        deadline = time.perf_counter()
+        while time.perf_counter() < until:
+            tick()
+            deadline += ms / 1000
+            await asyncio.sleep(max(0, deadline - time.perf_counter()))
+
+    async def follow_events(self, until):
+        """Reads the event stream. Returns False if it was refused.
+
+        Like a browser, it reuses an idle keep-alive connection (the one
+        that loaded the page) and holds one of the pool's connections for
+        as long as the stream is open.
+        """
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.open_connection(self.host, self.port)
+                reader, writer = conn
+                writer.write(b"GET /events HTTP/1.1\r\nHost: bomb\r\nAccept: text/event-stream\r\n\r\n")
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT_S)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                self.stats.error("/events")
+                if conn is not None:
+                    conn[1].close()
+                return False
+            if not head.startswith(b"HTTP/1.1 200"):
+                self.stats.refused_streams += 1
+                writer.close()
+                return False
+            try:
+                while True:
+                    left = until - time.perf_counter()
+                    if left <= 0:
+                        break
+                    try:
+                        line = await asyncio.wait_for(reader.readline(), left)
+                    except asyncio.TimeoutError:
+                        break
+                    if not line:
+                        self.stats.error("/events")
+                        break
+                    if line.startswith(b"data:"):
+                        self.stats.events += 1
+            except OSError:
+                self.stats.error("/events")
+            writer.close()
+            return True
+
+    async def run(self, mode, until):
+        if mode == "page":
+            await self.get("/", b"Accept-Encoding: gzip\r\n")
+            if await self.follow_events(until):
+                return
+            mode = "state"
+        if mode == "state":
+            await self.every(200, lambda: self.spawn(self.get("/state")), until)
+        else:
+            await asyncio.gather(
+                self.every(200, lambda: self.spawn(self.legacy_status()), until),
+                self.every(500, lambda: self.spawn(self.get("/statdisarm")), until),
+            )
+
+    async def legacy_status(self):
+        results = await asyncio.gather(*[self.get(path) for path in LEGACY_STATUS_ROUTES])
+        arming = results[-1]
+        if arming is not None and arming[1] == b"ARMING":
+            await self.get("/armprogress")
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        for reader, writer in self.idle:
+            writer.close()
+
+
+def header(head, name):
+    for line in head.split(b"\r\n")[1:]:
+        key, _, value = line.partition(b":")
+        if key.strip().lower() == name:
+            return value.strip()
+    return None
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = int(header(head, b"content-length") or 0)
+    body = await reader.readexactly(length) if length else b""
+    return status, head, body
+
+
+def start_sim(port, countdown):
+    """Starts the simulated bomb and waits for its server to come up."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, "-m", "sim.run", str(port)], cwd=root,
+                            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    give_up = time.time() + STARTUP_TIMEOUT_S
+    while True:
+        try:
+            urlopen(port, "/status")
+            break
+        except OSError:
+            if proc.poll() is not None or time.time() > give_up:
+                proc.kill()
+                raise SystemExit("simulated bomb did not start")
+            time.sleep(0.1)
+    if countdown:
+        # Hold the switch and button through the arming time, let go and
+        # start the countdown from the web, as a player would
+        command(proc, "switch 0\nbutton 0\n")
+        time.sleep(0.1)
+        command(proc, "advance 4100\n")
+        time.sleep(0.3)
+        command(proc, "switch 1\nbutton 1\n")
+        time.sleep(0.1)
+        if urlopen(port, "/activate") != b"Activated":
+            proc.kill()
+            raise SystemExit("could not start the countdown")
+    return proc
+
+
+def command(proc, text):
+    proc.stdin.write(text.encode())
+    proc.stdin.flush()
+
+
+def urlopen(port, path):
+    from urllib.request import urlopen
+    with urlopen("http://127.0.0.1:%d%s" % (port, path), timeout=2) as response:
+        return response.read()
+
+
+def report(stats, args, elapsed):
+    total = sum(len(v) for v in stats.latencies.values())
+    routes = {}
+    for path in sorted(set(stats.latencies) | set(stats.errors)):
+        latencies = stats.latencies.get(path, [])
+        routes[path] = {
+            "count": len(latencies),
+            "req_per_s": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.5), 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99), 2) if latencies else None,
+            "errors": stats.errors.get(path, 0),
+            "statuses": {str(k): v for k, v in sorted(stats.statuses.get(path, {}).items())},
+        }
+    return {
+        "mode": args.mode,
+        "clients": args.clients,
+        "countdown": args.countdown,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "req_per_s": round(total / elapsed, 1),
+        "socket_errors": sum(stats.errors.values()),
+        "events": stats.events,
+        "refused_streams": stats.refused_streams,
+        "routes": routes,
+    }
+
+
+def print_report(result):
+    print("%d clients, %s mode, %.1f s%s" % (result["clients"], result["mode"], result["duration_s"],
+                                             ", during a countdown" if result["countdown"] else ""))
+    print("%-20s %7s %8s %8s %8s %7s  %s" % ("route", "count", "req/s", "p50 ms", "p99 ms", "errors", "statuses"))
+    for path, r in result["routes"].items():
+        p50 = "-" if r["p50_ms"] is None else "%.1f" % r["p50_ms"]
+        p99 = "-" if r["p99_ms"] is None else "%.1f" % r["p99_ms"]
+        statuses = " ".join("%s:%d" % item for item in r["statuses"].items())
+        print("%-20s %7d %8.1f %8s %8s %7d  %s" % (path, r["count"], r["req_per_s"], p50, p99, r["errors"], statuses))
+    print("total: %d requests, %.1f req/s, %d socket errors" % (result["requests"], result["req_per_s"], result["socket_errors"]))
+    if result["mode"] == "page":
+        print("events: %d received, %d streams refused" % (result["events"], result["refused_streams"]))
+
+
+async def bench(args):
+    stats = Stats()
+    browsers = [Browser(args.host or "127.0.0.1", args.port, stats) for _ in range(args.clients)]
+    start = time.perf_counter()
+    until = start + args.duration
+    await asyncio.gather(*[b.run(args.mode, until) for b in browsers])
+    elapsed = time.perf_counter() - start
+    for b in browsers:
+        await b.close()
+    return report(stats, args, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the bomb's web server.")
+    parser.add_argument("--clients", type=int, default=4, help="simulated phones (default 4)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run (default 10)")
+    parser.add_argument("--mode", choices=["page", "state", "legacy"], default="page")
+    parser.add_argument("--countdown", action="store_true", help="arm and start the countdown first (simulation only)")
+    parser.add_argument("--host", help="test a running server instead of the simulation")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+    if args.host and args.countdown:
+        parser.error("--countdown needs the simulation")
+
+    proc = None if args.host else start_sim(args.port, args.countdown)
+    try:
+        result = asyncio.run(bench(args))
+    finally:
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+    if args.json == "-":
+        print(json.dumps(result, indent=2))
+        return
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
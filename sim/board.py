@@ -0,0 +1,10 @@
+# The simulated board being set up. Interfaces take the MAC of the board
+# that is current when they are created, so each script's WLAN and ESP-NOW
+# objects end up bound to its own board.
+
+mac = b"\x02\x00\x00\x00\x00\x01"
+
+
+def select(new_mac):
+    global mac
+    mac = bytes(new_mac)
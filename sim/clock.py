@@ -0,0 +1,75 @@
+# Virtual clock for the simulated boards.
+#
+# It runs in step with the host's clock, but advance() jumps it forward, so
+# a run can skip a 4 s arming hold or a 45 s countdown without waiting for
+# it. Ticks wrap like they do on the boards, which also exercises the
+# ticks_diff() handling in the code under test.
+import time as host
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD // 2
+
+offset_us = 0
+# Called after advance(); lets an event loop sleeping on the old time wake up
+on_advance = None
+
+if hasattr(host, "monotonic_ns"):
+    def host_us():
+        return host.monotonic_ns() // 1000
+else:
+    # MicroPython: host ticks wrap too, so keep a running total
+    host_last = host.ticks_us()
+    host_total = 0
+
+    def host_us():
+        global host_last, host_total
+        now = host.ticks_us()
+        host_total += host.ticks_diff(now, host_last)
+        host_last = now
+        return host_total
+
+
+def monotonic_us():
+    """Microseconds on the virtual clock, without wrapping."""
+    return host_us() + offset_us
+
+
+def advance(ms):
+    """Moves the virtual clock `ms` milliseconds ahead."""
+    global offset_us
+    offset_us += ms * 1000
+    if on_advance is not None:
+        on_advance()
+
+
+def ticks_us():
+    return monotonic_us() & TICKS_MAX
+
+
+def ticks_ms():
+    return (monotonic_us() // 1000) & TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def time():
+    return host.time() + offset_us // 1000000
+
+
+def sleep(seconds):
+    host.sleep(seconds)
+
+
+def sleep_ms(ms):
+    host.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    host.sleep(us / 1000000)
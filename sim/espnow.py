@@ -0,0 +1,74 @@
+# Stand-in for MicroPython's espnow module: a loopback link between the
+# simulated boards. Every active interface is registered under its board's
+# MAC, and send() puts the message straight into the receive queue of the
+# interface it is addressed to.
+import _thread
+from sim import board
+
+MAX_DATA_LEN = 250
+
+interfaces = {}
+
+
+class ESPNow:
+    def __init__(self):
+        self.mac = board.mac
+        self.peers = []
+        self.queue = []
+        self.lock = _thread.allocate_lock()
+        # Held while the queue is empty; receivers block on it
+        self.ready = _thread.allocate_lock()
+        self.ready.acquire()
+
+    def active(self, flag=None):
+        if flag is None:
+            return interfaces.get(self.mac) is self
+        if flag:
+            interfaces[self.mac] = self
+        elif interfaces.get(self.mac) is self:
+            del interfaces[self.mac]
+
+    def add_peer(self, mac, *args, **kwargs):
+        mac = bytes(mac)
+        if mac in self.peers:
+            raise OSError("ESP_ERR_ESPNOW_EXIST")
+        self.peers.append(mac)
+
+    def get_peers(self):
+        return tuple(self.peers)
+
+    def send(self, mac, msg, sync=True):
+        """Delivers `msg` to the board with MAC `mac`. Returns False, like a
+        missing ack, if no such board is listening.
+        """
+        if len(msg) > MAX_DATA_LEN:
+            raise ValueError("ESP_ERR_ESPNOW_ARG")
+        target = interfaces.get(bytes(mac))
+        if target is None:
+            return False
+        target.deliver(self.mac, bytes(msg))
+        return True
+
+    def deliver(self, mac, msg):
+        with self.lock:
+            self.queue.append((mac, msg))
+            if self.ready.locked():
+                self.ready.release()
+
+    def any(self):
+        return bool(self.queue)
+
+    def irecv(self, timeout_ms=None):
+        """Returns [mac, msg] for the next message. With a timeout of 0 it
+        returns [None, None] at once if there is none; otherwise it waits.
+        """
+        while True:
+            with self.lock:
+                if self.queue:
+                    mac, msg = self.queue.pop(0)
+                    return [mac, msg]
+            if timeout_ms == 0:
+                return [None, None]
+            self.ready.acquire()
+
+    recv = irecv
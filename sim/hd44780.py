@@ -0,0 +1,117 @@
+# Model of a HD44780 character LCD behind a PCF8574 I2C expander, as wired
+# for lcd_I2C.py: P0 = RS, P1 = RW, P2 = E, P3 = backlight, P4-P7 = D4-D7.
+# It decodes the bytes written to the expander the way the controller
+# would, so what it shows is what the real display would show.
+
+MASK_RS = 0x01
+MASK_E = 0x04
+MASK_BACKLIGHT = 0x08
+
+
+class HD44780:
+    def __init__(self, num_lines=2, num_columns=16):
+        self.num_lines = num_lines
+        self.num_columns = num_columns
+        self.ddram = bytearray(b" " * 128)
+        self.cgram = bytearray(64)
+        self.address = 0
+        self.in_cgram = False
+        self.increment = True
+        self.display = False
+        self.cursor = False
+        self.blink = False
+        self.backlight = False
+        self.two_lines = False
+        # Powers up in 8-bit mode, until a function set says otherwise
+        self.four_bit = False
+        self.high = None
+        self.last = 0
+        # Bumped whenever what is shown may have changed
+        self.changes = 0
+        self.writes = 0
+
+    def write(self, buf):
+        """Takes the bytes of one I2C write to the expander."""
+        self.writes += 1
+        for byte in buf:
+            self.backlight = bool(byte & MASK_BACKLIGHT)
+            # The controller latches D4-D7 on the falling edge of E
+            if self.last & MASK_E and not byte & MASK_E:
+                self.latch(self.last >> 4, self.last & MASK_RS)
+            self.last = byte
+
+    def latch(self, nibble, rs):
+        if not self.four_bit:
+            # D0-D3 are not wired, so they read as 0
+            self.execute(nibble << 4, rs)
+        elif self.high is None:
+            self.high = nibble
+        else:
+            value = (self.high << 4) | nibble
+            self.high = None
+            self.execute(value, rs)
+
+    def execute(self, value, rs):
+        self.changes += 1
+        if rs:
+            if self.in_cgram:
+                self.cgram[self.address & 0x3f] = value
+                self.address = (self.address + (1 if self.increment else -1)) & 0x3f
+            else:
+                self.ddram[self.address] = value
+                self.step(1 if self.increment else -1)
+        elif value & 0x80:
+            self.in_cgram = False
+            self.address = value & 0x7f
+        elif value & 0x40:
+            self.in_cgram = True
+            self.address = value & 0x3f
+        elif value & 0x20:
+            self.four_bit = not value & 0x10
+            self.two_lines = bool(value & 0x08)
+        elif value & 0x10:
+            # Cursor or display shift; only cursor moves are modelled
+            if not value & 0x08:
+                self.step(1 if value & 0x04 else -1)
+        elif value & 0x08:
+            self.display = bool(value & 0x04)
+            self.cursor = bool(value & 0x02)
+            self.blink = bool(value & 0x01)
+        elif value & 0x04:
+            self.increment = bool(value & 0x02)
+        elif value & 0x02:
+            self.in_cgram = False
+            self.address = 0
+        elif value & 0x01:
+            self.ddram[:] = b" " * len(self.ddram)
+            self.in_cgram = False
+            self.address = 0
+            self.increment = True
+
+    def step(self, delta):
+        """Moves the DDRAM address the way the controller does, across the
+        gap between the two lines' address ranges.
+        """
+        if not self.two_lines:
+            self.address = (self.address + delta) % 80
+        elif delta > 0:
+            self.address = {0x27: 0x40, 0x67: 0x00}.get(self.address, self.address + 1)
+        else:
+            self.address = {0x40: 0x27, 0x00: 0x67}.get(self.address, self.address - 1)
+
+    def line(self, y):
+        """The text on row `y`, as the display shows it."""
+        start = (0x00, 0x40, 0x14, 0x54)[y]
+        row = self.ddram[start:start + self.num_columns]
+        return "".join(chr(c) if 32 <= c < 127 else "?" for c in row)
+
+    def lines(self):
+        return [self.line(y) for y in range(self.num_lines)]
+
+    def cursor_position(self):
+        """(x, y) of the cursor; y is None if it is off the visible rows."""
+        for y in range(self.num_lines):
+            start = (0x00, 0x40, 0x14, 0x54)[y]
+            if start <= self.address < start + self.num_columns:
+                return self.address - start, y
+        return self.address, None
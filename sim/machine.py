@@ -0,0 +1,90 @@
+# Stand-in for MicroPython's machine module: pins that a test or the host
+# runner can drive, a PWM that remembers its output, and an I2C bus with
+# whatever devices were attached through i2c_devices.
+
+# I2C address -> device with a write(buf) method; every I2C bus sees these
+i2c_devices = {}
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.handler = None
+        self.trigger = 0
+        if value is not None:
+            self.level = 1 if value else 0
+        else:
+            self.level = 0 if pull == self.PULL_DOWN else 1 if pull == self.PULL_UP else 0
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        self.level = 1 if level else 0
+
+    def on(self):
+        self.level = 1
+
+    def off(self):
+        self.level = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self.handler = handler
+        self.trigger = trigger
+
+    def set(self, level):
+        """Drives an input from outside, firing the IRQ on a matching edge."""
+        level = 1 if level else 0
+        if level == self.level:
+            return
+        self.level = level
+        edge = self.IRQ_RISING if level else self.IRQ_FALLING
+        if self.handler is not None and self.trigger & edge:
+            self.handler(self)
+
+
+class PWM:
+    def __init__(self, dest, *args, freq=None, duty_u16=None):
+        self.pin = dest
+        self.frequency = freq or 0
+        self.duty = duty_u16 or 0
+
+    def freq(self, value=None):
+        if value is None:
+            return self.frequency
+        self.frequency = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self.duty
+        self.duty = value
+
+    def deinit(self):
+        self.duty = 0
+
+    def tone(self):
+        """The frequency being played, or 0 when silent."""
+        return self.frequency if self.duty else 0
+
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+
+    def scan(self):
+        return sorted(i2c_devices)
+
+    def writeto(self, addr, buf, stop=True):
+        device = i2c_devices.get(addr)
+        if device is None:
+            raise OSError(19)  # ENODEV, like a missing ack
+        device.write(bytes(buf))
+        return len(buf)
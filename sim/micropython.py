@@ -0,0 +1,20 @@
+# Stand-in for the micropython module under CPython.
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+viper = native
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
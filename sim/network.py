@@ -0,0 +1,37 @@
+# Stand-in for MicroPython's network module. Nothing is really brought up:
+# on the host the HTTP server listens on localhost instead of the AP.
+from sim import board
+
+STA_IF = 0
+AP_IF = 1
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self.mac = board.mac
+        self.up = False
+        self.settings = {"essid": "", "password": "", "channel": 1}
+
+    def active(self, flag=None):
+        if flag is None:
+            return self.up
+        self.up = bool(flag)
+
+    def config(self, *names, **settings):
+        if settings:
+            self.settings.update(settings)
+            return None
+        if names[0] == "mac":
+            return self.mac
+        if names[0] not in self.settings:
+            raise ValueError("unknown config param")
+        return self.settings[names[0]]
+
+    def ifconfig(self):
+        if self.interface == AP_IF:
+            return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "0.0.0.0")
+        return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+    def isconnected(self):
+        return False
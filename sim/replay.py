@@ -0,0 +1,200 @@
+# Replays a bomb's event journal against the simulated bomb. Runs on the
+# host under CPython:
+#
+#   python -m sim.replay JOURNAL [--list] [--boot N] [--fast] [--port P]
+#
+# from the repo root. JOURNAL is a file saved from /journal, or that URL,
+# e.g. http://192.168.4.1/journal. It prints the timeline of one boot (the
+# last by default). Unless --list is given, it then feeds that boot's input
+# changes and web commands to the simulated bomb at their recorded times
+# and compares the phases it goes through with the recorded ones; the exit
+# status is 1 if they differ, or if either has two beeps closer together
+# than the countdown allows. --fast skips the waits between events by
+# advancing the virtual clock instead of sleeping.
+import argparse
+import asyncio
+import sys
+
+import sim
+from sim import clock, run
+import journal
+from journal import EV_BOOT, EV_PHASE, EV_INPUT, EV_TICK, EV_COMMAND, EVENT_NAMES, COMMANDS
+from bomb_state import PHASE_NAMES
+
+# Phases may land this much later or earlier than recorded and still match
+TOLERANCE_MS = 250
+# With --fast, the clock moves on in steps this long, so the bomb's tasks
+# see the time pass as they would have
+FAST_STEP_MS = 20
+
+
+def load(source):
+    if source.startswith("http://"):
+        from urllib.request import urlopen
+        with urlopen(source, timeout=10) as response:
+            return response.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def boots(records):
+    """Splits the records into one list per boot. Records from before the
+    first BOOT (cut short by the ring or the file rotation) come first.
+    """
+    sessions = [[]]
+    for record in records:
+        if record[1] == EV_BOOT and sessions[-1]:
+            sessions.append([])
+        sessions[-1].append(record)
+    return sessions
+
+
+def describe(record):
+    ticks, code, a, b = record
+    if code == EV_PHASE:
+        return "%s, hold left %.2f s" % (PHASE_NAMES[a].decode(), b / 100)
+    if code == EV_INPUT:
+        return "switch %d, button %d" % (a >> 1, a & 1)
+    if code == EV_TICK:
+        return "%.2f s left, %d ms late" % (b / 1000, a)
+    if code == EV_COMMAND:
+        return "%s -> %d" % (COMMANDS[a].decode(), b)
+    if code == EV_BOOT:
+        return "format %d" % b
+    return "a=%d b=%d" % (a, b)
+
+
+def print_timeline(records):
+    t0 = records[0][0]
+    for record in records:
+        name = EVENT_NAMES.get(record[1], "?%d" % record[1])
+        print("%9.3f  %-8s %s" % (clock.ticks_diff(record[0], t0) / 1000, name, describe(record)))
+
+
+def phases(records):
+    """(ms since the first record, phase) for every PHASE record."""
+    t0 = records[0][0]
+    return [(clock.ticks_diff(r[0], t0), r[2]) for r in records if r[1] == EV_PHASE]
+
+
+async def command(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET " + path + b" HTTP/1.1\r\nConnection: close\r\n\r\n")
+    response = await reader.read()
+    writer.close()
+    return int(response[9:12])
+
+
+async def replay(records, bomb, port, fast):
+    """Drives the simulated bomb with the inputs and commands in `records`
+    and returns the records it journaled itself.
+    """
+    asyncio.create_task(bomb.main(port))
+    await asyncio.sleep(0.2)
+    # Time both from their BOOT records
+    start = boots(journal.decode(bomb.history.snapshot()))[-1][0][0]
+    t0 = records[0][0]
+    for ticks, code, a, b in records:
+        while True:
+            wait = clock.ticks_diff(ticks, t0) - clock.ticks_diff(clock.ticks_ms(), start)
+            if wait <= 0:
+                break
+            if fast:
+                clock.advance(min(wait, FAST_STEP_MS))
+                await asyncio.sleep(0.002)
+            else:
+                await asyncio.sleep(wait / 1000)
+        if code == EV_INPUT:
+            bomb.SWITCH.set(a >> 1)
+            bomb.BTN.set(a & 1)
+        elif code == EV_COMMAND:
+            status = await command(port, COMMANDS[a])
+            if status != b:
+                print("%s answered %d, recorded %d" % (COMMANDS[a].decode(), status, b))
+    # Let the last inputs settle
+    await asyncio.sleep(0.5)
+    return boots(journal.decode(bomb.history.snapshot()))[-1]
+
+
+def close_ticks(records, bomb):
+    """TICK records that came sooner after the one before than the beep
+    interval allows, as (ms since the first record, gap, interval). A tick
+    may make up for a late one by bomb.catch_up_ms(), and the last one
+    lands on the end whatever the interval.
+    """
+    t0 = records[0][0]
+    found = []
+    ticks = [r for r in records if r[1] == EV_TICK]
+    for (t1, _, late, left), (t2, _, _, left2) in zip(ticks, ticks[1:]):
+        if left2 <= 0 or left2 > left:
+            continue
+        interval = bomb.beep_interval(bomb.COUNTDOWN_MS - left - late)
+        gap = clock.ticks_diff(t2, t1)
+        # Records are in whole ms
+        if gap < interval - bomb.catch_up_ms(interval) - 1:
+            found.append((clock.ticks_diff(t2, t0), gap, interval))
+    return found
+
+
+def check_ticks(name, records, bomb):
+    """Prints the ticks close_ticks() finds. Returns True if there are none."""
+    found = close_ticks(records, bomb)
+    for at, gap, interval in found:
+        print("%s tick at %.3f s came %d ms after the last, interval %d ms" % (name, at / 1000, gap, interval))
+    return not found
+
+
+def compare(recorded, replayed):
+    """Prints both phase sequences side by side. Returns True if they match."""
+    ok = len(recorded) == len(replayed)
+    print("\n%-24s %-24s" % ("recorded", "replayed"))
+    for i in range(max(len(recorded), len(replayed))):
+        left = right = ""
+        if i < len(recorded):
+            left = "%8.3f %s" % (recorded[i][0] / 1000, PHASE_NAMES[recorded[i][1]].decode())
+        if i < len(replayed):
+            right = "%8.3f %s" % (replayed[i][0] / 1000, PHASE_NAMES[replayed[i][1]].decode())
+        mark = ""
+        if i >= len(recorded) or i >= len(replayed) or recorded[i][1] != replayed[i][1]:
+            mark = "  <- differs"
+            ok = False
+        elif abs(recorded[i][0] - replayed[i][0]) > TOLERANCE_MS:
+            mark = "  <- %+d ms" % (replayed[i][0] - recorded[i][0])
+            ok = False
+        print("%-24s %-24s%s" % (left, right, mark))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a bomb's event journal in the simulation.")
+    parser.add_argument("journal", help="file saved from /journal, or its URL")
+    parser.add_argument("--list", action="store_true", help="only print the timeline")
+    parser.add_argument("--boot", type=int, default=-1, help="which boot to replay (default the last)")
+    parser.add_argument("--fast", action="store_true", help="advance the virtual clock instead of waiting")
+    parser.add_argument("--port", type=int, default=8082)
+    args = parser.parse_args()
+
+    records = list(journal.decode(load(args.journal)))
+    if not records:
+        raise SystemExit("the journal is empty")
+    session = boots(records)[args.boot]
+    print_timeline(session)
+    if args.list:
+        return
+    if session[0][1] != EV_BOOT:
+        raise SystemExit("the start of this boot is missing; it cannot be replayed")
+
+    sim.install()
+    bomb = run.boot_bomb()
+    # The replay's own journal stays in RAM
+    bomb.history.path = None
+    replayed = asyncio.run(replay(session, bomb, args.port, args.fast))
+    ok = compare(phases(session), phases(replayed))
+    ok = check_ticks("recorded", session, bomb) and ok
+    ok = check_ticks("replayed", replayed, bomb) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
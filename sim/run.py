@@ -0,0 +1,115 @@
+# Runs both boards on the host, linked by the loopback ESP-NOW:
+#
+#   python -m sim.run [port]      (or micropython -m sim.run [port])
+#
+# from the repo root. The control page is then at http://localhost:<port>/
+# (8080 by default), the LCD is printed whenever it changes, and the inputs
+# are driven by typing commands; "help" lists them.
+import sys
+import _thread
+
+import sim
+from sim import board, clock, machine
+from sim.hd44780 import HD44780
+
+# bomb_new sends to this MAC, so it is the LCD board's
+LCD_MAC = b"\x7c\xdf\xa1\x94\x11\x40"
+BOMB_MAC = b"\x02\x00\x00\x00\x00\x01"
+LCD_ADDR = 0x27
+DEFAULT_PORT = 8080
+
+HELP = """switch 0|1    drive the key switch (0 = turned)
+button 0|1    drive the arm button (0 = pressed)
+advance MS    move the virtual clock ahead
+lcd           print the LCD
+state         print what the pages show
+quit"""
+
+
+def boot_lcd():
+    """Sets up the LCD board, starts its threads and returns its display."""
+    display = HD44780()
+    machine.i2c_devices[LCD_ADDR] = display
+    board.select(LCD_MAC)
+    # The script's name is not importable, so run it like the board does
+    scope = {"__name__": "boot_lcd"}
+    with open("boot-lcd.py") as f:
+        exec(f.read(), scope)
+    scope["start"]()
+    return display
+
+
+def boot_bomb():
+    """Sets up the bomb board and returns its module, not yet running."""
+    board.select(BOMB_MAC)
+    import bomb_new
+    return bomb_new
+
+
+def setup():
+    """Installs the simulation and boots both boards. Returns the LCD
+    display model and the bomb_new module; bomb_new.run() or main() starts
+    the bomb.
+    """
+    sim.install()
+    display = boot_lcd()
+    return display, boot_bomb()
+
+
+def show(display):
+    border = "+" + "-" * display.num_columns + "+"
+    print(border)
+    for line in display.lines():
+        print("|" + line + "|")
+    print(border)
+
+
+def watch(display):
+    """Prints the LCD whenever the controller has been written to."""
+    seen = display.changes
+    while True:
+        clock.sleep_ms(50)
+        if display.changes != seen:
+            seen = display.changes
+            show(display)
+
+
+def console(display, bomb):
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            return
+        words = line.split()
+        try:
+            if not words:
+                continue
+            elif words[0] == "switch":
+                bomb.SWITCH.set(int(words[1]))
+            elif words[0] == "button":
+                bomb.BTN.set(int(words[1]))
+            elif words[0] == "advance":
+                clock.advance(int(words[1]))
+            elif words[0] == "lcd":
+                show(display)
+            elif words[0] == "state":
+                print(bomb.state_json())
+            elif words[0] == "quit":
+                import os
+                os._exit(0)
+            else:
+                print(HELP)
+        except (IndexError, ValueError):
+            print(HELP)
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    display, bomb = setup()
+    _thread.start_new_thread(watch, (display,))
+    _thread.start_new_thread(console, (display, bomb))
+    print("Control page at http://localhost:%d/" % port)
+    bomb.run(port)
+
+
+if __name__ == "__main__":
+    main()